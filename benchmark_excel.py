@@ -0,0 +1,53 @@
+"""Time export_to_excel for statements of 10 / 1,000 / 10,000 items.
+
+Usage: python benchmark_excel.py [repeats]
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from export_excel import export_to_excel
+
+SIZES = [10, 1000, 10000]
+
+
+def make_order(n_items):
+    return {
+        "order_id": "YK20260101001",
+        "date": "2026-01-01",
+        "customer": "测试客户",
+        "address": "广州市天河区",
+        "maker": "管理员",
+        "items": [
+            {
+                "name": f"硒鼓 {i}",
+                "model": "TA-W2041A",
+                "unit": "个",
+                "qty": (i % 9) + 1,
+                "price": 12.5 + i % 7,
+                "remark": "A" if i % 3 else "",
+            }
+            for i in range(n_items)
+        ],
+    }
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"{'items':>8}  {'best (s)':>10}  {'per 1k items (s)':>16}")
+    for n in SIZES:
+        order = make_order(n)
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            export_to_excel(order, io.BytesIO())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{n:>8}  {best:>10.3f}  {best / n * 1000:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Below this many files the cost of starting worker processes outweighs the gain
+PROCESS_THRESHOLD = 4
+
+
+def export_filename(order, ext='.pdf'):
+    """OrderID_Customer.pdf, with path separators replaced."""
+    safe_name = (order.get('order_id') or 'Unknown').replace('/', '_').replace('\\', '_')
+    safe_cust = (order.get('customer') or 'Client').replace('/', '_').replace('\\', '_')
+    return f"{safe_name}_{safe_cust}{ext}"
+
+
+def _init_worker(font_hint):
+    # Runs once per worker process, so every job in it reuses the registered font
+    from export_pdf import register_fonts
+    register_fonts(font_hint)
+
+
+def _export_one(order, filepath, report_type, seller_info):
+    # Orders don't change once saved, so re-exports are mostly cache hits
+    from pdf_cache import export_pdf_cached
+    export_pdf_cached(order, filepath, report_type=report_type, seller_info=seller_info)
+    return filepath
+
+
+def _render_one(order, report_type, seller_info):
+    # Zip mode: the PDF comes back as bytes and the parent writes the entry
+    from pdf_cache import render_pdf_cached
+    return render_pdf_cached(order, report_type=report_type, seller_info=seller_info)
+
+
+def _unique_names(names):
+    # Two orders can share ID and customer; a zip must not repeat an entry name
+    seen = set()
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 1
+        while candidate in seen:
+            n += 1
+            candidate = f"{stem} ({n}){ext}"
+        seen.add(candidate)
+        yield candidate
+
+
+class BatchExporter:
+    """Renders many orders to PDF in a process pool.
+
+    Files go into directory, or, when zip_path is given, into a single zip of
+    "OrderID_Customer.pdf" entries streamed straight from memory with no temp
+    files.
+
+    start() returns immediately. The UI polls progress()/is_finished() (e.g.
+    via root.after) and may call cancel(); report() lists what happened to
+    each file.
+    """
+
+    def __init__(self, orders, directory=None, seller_info=None, report_type='delivery',
+                 font_hint=None, max_workers=None, zip_path=None):
+        self.zip_path = zip_path
+        # Unique names in folder mode too: two workers writing one path would clobber each other
+        names = _unique_names(export_filename(order) for order in orders)
+        if zip_path:
+            self.jobs = list(zip(orders, names))
+        else:
+            self.jobs = [(order, os.path.join(directory, name)) for order, name in zip(orders, names)]
+        self.seller_info = seller_info
+        self.report_type = report_type
+        self.font_hint = font_hint
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = []
+        self._succeeded = []
+        self._failed = []     # (filepath, error message)
+        self._zip = None
+        self._settled = 0     # finished or cancelled futures
+        self._generation = 0  # bumped when a failed pool is replaced
+
+    @property
+    def total(self):
+        return len(self.jobs)
+
+    def start(self):
+        workers = max(1, min(self.max_workers, self.total))
+        if self.total >= PROCESS_THRESHOLD and workers > 1:
+            executor = None
+            try:
+                executor = ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker, initargs=(self.font_hint,)
+                )
+                self._submit_all(executor)
+                return
+            except Exception:
+                # No process support here (sandbox, odd frozen build): fall through.
+                # Drop the queued jobs and let running ones finish, so nothing from
+                # the old pool writes a file after the threads take over.
+                if executor is not None:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                with self._lock:
+                    self._generation += 1
+                    self._futures = []
+                    self._settled = 0
+                    self._succeeded = []
+                    self._failed = []
+                    if self._zip is not None:
+                        self._zip.close()
+                        self._zip = None
+
+        # Small batch: one background thread is enough
+        self._submit_all(ThreadPoolExecutor(
+            max_workers=1, initializer=_init_worker, initargs=(self.font_hint,)
+        ))
+
+    def _submit_all(self, executor):
+        self._executor = executor
+        if self.zip_path and self._zip is None:
+            # PDFs are already deflated inside, so store entries as they are
+            self._zip = zipfile.ZipFile(self.zip_path, 'w', zipfile.ZIP_STORED)
+        for order, filepath in self.jobs:
+            # Drop UI-only keys such as '_checked'
+            clean = {k: v for k, v in order.items() if not k.startswith('_')}
+            if self.zip_path:
+                future = executor.submit(_render_one, clean, self.report_type, self.seller_info)
+            else:
+                future = executor.submit(_export_one, clean, filepath, self.report_type, self.seller_info)
+            self._futures.append(future)
+            future.add_done_callback(lambda f, p=filepath, g=self._generation: self._on_done(f, p, g))
+
+        if self._zip is not None and not self.jobs:
+            self._close_zip()
+
+        # Lets the pool wind down once the queue drains; does not block
+        executor.shutdown(wait=False)
+
+    def _on_done(self, future, filepath, generation):
+        with self._lock:
+            if generation != self._generation:
+                return   # straggler from a pool that was abandoned in start()
+            self._settled += 1
+            if not future.cancelled():
+                error = future.exception()
+                if error is None and self._zip is not None:
+                    try:
+                        self._zip.writestr(filepath, future.result())
+                    except Exception as e:
+                        error = e
+                if error is None:
+                    self._succeeded.append(filepath)
+                else:
+                    self._failed.append((filepath, str(error)))
+
+            if self._zip is not None and self._settled == len(self.jobs):
+                self._close_zip()
+
+    def _close_zip(self):
+        try:
+            self._zip.close()
+        except Exception as e:
+            self._failed.append((self.zip_path, str(e)))
+        self._zip = None
+
+    def cancel(self):
+        """Stop queued jobs. Files already being rendered are allowed to finish."""
+        self.cancelled = True
+        for future in self._futures:
+            future.cancel()
+
+    def progress(self):
+        """(finished, total) where finished counts successes and failures."""
+        with self._lock:
+            return len(self._succeeded) + len(self._failed), self.total
+
+    def is_finished(self):
+        # In zip mode the archive must also be closed (last callback does that)
+        with self._lock:
+            return self._settled == len(self._futures) and self._zip is None
+
+    def report(self):
+        with self._lock:
+            return {
+                'succeeded': list(self._succeeded),
+                'failed': list(self._failed),
+                'cancelled': sum(1 for f in self._futures if f.cancelled()),
+            }
@@ -1,21 +1,53 @@
+import io
+
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
+from openpyxl.styles import Font, Alignment, Border, Side, NamedStyle
+
+
+# Cell styles are defined once and registered as NamedStyles in each
+# workbook; cells then just reference them by name. Assigning font/border/
+# alignment/number_format cell by cell made openpyxl intern every
+# combination again, which dominated the time for large statements.
+_thin = Side(border_style="thin", color="000000")
+_border = Border(top=_thin, left=_thin, right=_thin, bottom=_thin)
+_center = Alignment(horizontal='center')
+# A NamedStyle without a font gets a blank one, not the workbook default
+_body_font = Font(name='Calibri', size=11)
+
+STYLE_SELLER = "DO Seller"
+STYLE_TITLE = "DO Title"
+STYLE_HEADER = "DO Header"
+STYLE_TEXT = "DO Body Text"
+STYLE_MONEY = "DO Body Money"
+STYLE_TOTAL = "DO Total"
+
+_STYLE_SPECS = [
+    (STYLE_SELLER, dict(font=Font(name='Microsoft YaHei', size=20, bold=True), alignment=_center)),
+    (STYLE_TITLE, dict(font=Font(name='Microsoft YaHei', size=16, bold=True), alignment=_center)),
+    (STYLE_HEADER, dict(font=Font(name='Microsoft YaHei', size=11, bold=True), border=_border, alignment=_center)),
+    (STYLE_TEXT, dict(font=_body_font, border=_border)),
+    (STYLE_MONEY, dict(font=_body_font, border=_border, number_format='0.00')),
+    (STYLE_TOTAL, dict(font=Font(name='Microsoft YaHei', size=11, bold=True), border=_border, number_format='0.00')),
+]
+
+
+def _register_styles(wb):
+    # A NamedStyle belongs to the workbook it is added to, so build fresh ones
+    for name, spec in _STYLE_SPECS:
+        wb.add_named_style(NamedStyle(name=name, **spec))
 
 
-def export_to_excel(order_data, filepath, report_type='delivery', seller_info=None):
+def export_to_excel(order_data, filepath=None, report_type='delivery', seller_info=None):
+    """Write one order as .xlsx. filepath may be a path or a writable binary
+    buffer; with a buffer, or with no target, the file's bytes are returned.
+    """
     wb = Workbook()
+    _register_styles(wb)
     ws = wb.active
     ws.title = "Sheet1"
     
-    # Font Styles
-    font_title = Font(name='Microsoft YaHei', size=16, bold=True)
-    font_header = Font(name='Microsoft YaHei', size=11, bold=True)
     font_normal = Font(name='Microsoft YaHei', size=10)
     
-    # Borders
-    thin = Side(border_style="thin", color="000000")
-    border = Border(top=thin, left=thin, right=thin, bottom=thin)
-    
     # 1. Title
     title_text = "销售汇总表" if report_type == 'summary' else "销售出货单"
     seller_name = seller_info.get('name', "广州市 XX 办公设备有限公司") if seller_info else "广州市 XX 办公设备有限公司"
@@ -23,14 +55,12 @@ def export_to_excel(order_data, filepath, report_type='delivery', seller_info=No
     ws.merge_cells('A1:H1')
     c1 = ws['A1']
     c1.value = seller_name
-    c1.font = Font(name='Microsoft YaHei', size=20, bold=True)
-    c1.alignment = Alignment(horizontal='center')
+    c1.style = STYLE_SELLER
     
     ws.merge_cells('A2:H2')
     c2 = ws['A2']
     c2.value = title_text
-    c2.font = font_title
-    c2.alignment = Alignment(horizontal='center')
+    c2.style = STYLE_TITLE
     
     # 2. Header Info
     # Row 3: Customer | Date
@@ -63,10 +93,7 @@ def export_to_excel(order_data, filepath, report_type='delivery', seller_info=No
     header_row = row_offset + 2
     
     for idx, h in enumerate(headers):
-        cell = ws.cell(row=header_row, column=idx+1, value=h)
-        cell.font = font_header
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center')
+        ws.cell(row=header_row, column=idx+1, value=h).style = STYLE_HEADER
         
     # 4. Items
     items = order_data.get('items', [])
@@ -74,31 +101,25 @@ def export_to_excel(order_data, filepath, report_type='delivery', seller_info=No
     
     current_row = header_row + 1
     for idx, item in enumerate(items):
-        # 1-based index
-        ws.cell(row=current_row, column=1, value=idx+1).border = border
-        ws.cell(row=current_row, column=2, value=item.get('name', '')).border = border
-        ws.cell(row=current_row, column=3, value=item.get('model', '')).border = border
-        ws.cell(row=current_row, column=4, value=item.get('unit', '')).border = border
-        
         qty = float(item.get('qty', 0)) # Ensure float/int
         # Convert to int if integer
         if qty.is_integer(): qty = int(qty)
-            
-        ws.cell(row=current_row, column=5, value=qty).border = border
-        
         price = float(item.get('price', 0))
-        ws.cell(row=current_row, column=6, value=price).border = border
-        ws.cell(row=current_row, column=6).number_format = '0.00'
-        
         total = qty * price
-        ws.cell(row=current_row, column=7, value=total).border = border
-        ws.cell(row=current_row, column=7).number_format = '0.00'
-        
-        ws.cell(row=current_row, column=8, value=item.get('remark', '')).border = border
-        
-        # Center align most cols except Name(2) and Model(3) maybe?
-        # Let's align all center or left? Usually numbers right.
-        # Simple for now: Center all except Name.
+
+        # (value, style) per column: 1-based index, name, model, unit, qty, price, total, remark
+        cells = (
+            (idx + 1, STYLE_TEXT),
+            (item.get('name', ''), STYLE_TEXT),
+            (item.get('model', ''), STYLE_TEXT),
+            (item.get('unit', ''), STYLE_TEXT),
+            (qty, STYLE_TEXT),
+            (price, STYLE_MONEY),
+            (total, STYLE_MONEY),
+            (item.get('remark', ''), STYLE_TEXT),
+        )
+        for col, (value, style) in enumerate(cells, start=1):
+            ws.cell(row=current_row, column=col, value=value).style = style
         
         grand_total += total
         current_row += 1
@@ -108,22 +129,17 @@ def export_to_excel(order_data, filepath, report_type='delivery', seller_info=No
     ws.merge_cells(f'A{total_row}:F{total_row}')
     cell = ws[f'A{total_row}']
     cell.value = "合计"
-    cell.font = font_header
-    cell.alignment = Alignment(horizontal='center')
-    cell.border = border
+    cell.style = STYLE_HEADER
     
     # Border for merged cells needs setting on all
-    for col in range(1, 7):
-        ws.cell(row=total_row, column=col).border = border
+    for col in range(2, 7):
+        ws.cell(row=total_row, column=col).style = STYLE_TEXT
         
     # Amount
-    c_amount = ws.cell(row=total_row, column=7, value=grand_total)
-    c_amount.font = font_header
-    c_amount.border = border
-    c_amount.number_format = '0.00'
+    ws.cell(row=total_row, column=7, value=grand_total).style = STYLE_TOTAL
     
     # Remark slot for total row
-    ws.cell(row=total_row, column=8).border = border
+    ws.cell(row=total_row, column=8).style = STYLE_TEXT
     
     # 6. Footer
     footer_row = total_row + 2
@@ -140,4 +156,7 @@ def export_to_excel(order_data, filepath, report_type='delivery', seller_info=No
     ws.column_dimensions['G'].width = 12
     ws.column_dimensions['H'].width = 15
     
-    wb.save(filepath)
+    target = io.BytesIO() if filepath is None else filepath
+    wb.save(target)
+    getvalue = getattr(target, 'getvalue', None)
+    return getvalue() if getvalue else None
@@ -2,14 +2,21 @@ from reportlab.lib.pagesizes import A4, landscape
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+import functools
+import io
 import os
 import sys
+import threading
+import weakref
 
-def register_fonts():
-    """Register Chinese fonts based on OS."""
-    font_reg = 'Helvetica'
-    font_bold = 'Helvetica-Bold'
-    
+# Fonts are registered once per process: parsing msyh.ttc (~20 MB) is the
+# most expensive part of an export.
+_font_lock = threading.Lock()
+_registered_fonts = None   # (font_reg, font_bold) once resolved
+_font_choice = None        # (path, name, sub_index) of the font file that won
+
+
+def _font_candidates():
     # Candidate fonts: (FilePath, FontName, SubFontIndex for TTC)
     # Note: On Windows, msyh is often a TTC (Collection).
     
@@ -36,271 +43,428 @@ def register_fonts():
     # Default fallbacks (in case bundled in resources locally)
     candidates.append(('resources/msyh.ttf', 'BundledYaHei', -1))
     candidates.append(('resources/msyh.ttc', 'BundledYaHei', 0))
+    return candidates
 
-    try:
-        import debug_utils
-    except ImportError:
-        debug_utils = None
-
-    for path, name, sub_index in candidates:
-        if os.path.exists(path):
-            try:
-                if sub_index >= 0:
-                    # TTC Collection
-                    pdfmetrics.registerFont(TTFont(name, path, subfontIndex=sub_index))
-                else:
-                    # Normal TTF
-                    pdfmetrics.registerFont(TTFont(name, path))
-                
-                # Success
-                if debug_utils: debug_utils.log(f"Registered Font: {name} from {path}")
-                return name, name # Use same for bold if we don't have explicit bold (simpler)
-            except Exception as e:
-                if debug_utils: debug_utils.log(f"Failed to register {path}: {e}")
-                continue
-                
-    if debug_utils: debug_utils.log("Failed to register any Chinese font. Using Helvetica.")
-    return font_reg, font_bold
-
-def export_pdf(order_data, filepath, report_type='delivery', seller_info=None):
+
+def register_fonts(hint=None):
+    """Register Chinese fonts based on OS. Cached for the life of the process.
+
+    hint: a (path, name, sub_index) remembered from an earlier run (see
+    get_font_choice); it is tried first so the usual case skips probing.
+    """
+    global _registered_fonts, _font_choice
+
+    with _font_lock:
+        if _registered_fonts is not None:
+            return _registered_fonts
+
+        font_reg = 'Helvetica'
+        font_bold = 'Helvetica-Bold'
+
+        candidates = _font_candidates()
+        if hint and len(hint) == 3:
+            candidates.insert(0, tuple(hint))
+
+        try:
+            import debug_utils
+        except ImportError:
+            debug_utils = None
+
+        for path, name, sub_index in candidates:
+            if os.path.exists(path):
+                try:
+                    if sub_index >= 0:
+                        # TTC Collection
+                        pdfmetrics.registerFont(TTFont(name, path, subfontIndex=sub_index))
+                    else:
+                        # Normal TTF
+                        pdfmetrics.registerFont(TTFont(name, path))
+                    
+                    # Success
+                    if debug_utils: debug_utils.log(f"Registered Font: {name} from {path}")
+                    _font_choice = (path, name, sub_index)
+                    _registered_fonts = (name, name) # Use same for bold if we don't have explicit bold (simpler)
+                    return _registered_fonts
+                except Exception as e:
+                    if debug_utils: debug_utils.log(f"Failed to register {path}: {e}")
+                    continue
+                    
+        if debug_utils: debug_utils.log("Failed to register any Chinese font. Using Helvetica.")
+        _registered_fonts = (font_reg, font_bold)
+        return _registered_fonts
+
+
+def get_font_choice():
+    """The (path, name, sub_index) that register_fonts picked, or None."""
+    return _font_choice
+
+
+def _rendered_bytes(target):
+    # In-memory targets hand their contents back; files on disk return None
+    getvalue = getattr(target, 'getvalue', None)
+    return getvalue() if getvalue else None
+
+
+def export_pdf(order_data, filepath=None, report_type='delivery', seller_info=None):
+    """Render one order. filepath may be a path or a writable binary buffer
+    (e.g. io.BytesIO); with a buffer, or with no target at all, the PDF
+    bytes are returned.
+    """
+    target = io.BytesIO() if filepath is None else filepath
     # Use Landscape A4
-    page_size = landscape(A4)
-    width, height = page_size 
-    page_size = landscape(A4)
-    width, height = page_size 
-    font_reg, font_bold = register_fonts()
-    
-    c = canvas.Canvas(filepath, pagesize=page_size)
-    
+    c = canvas.Canvas(target, pagesize=landscape(A4))
+    _draw_order(c, order_data, report_type, seller_info, register_fonts())
+    c.save()
+    return _rendered_bytes(target)
+
+
+def export_combined_pdf(orders, filepath=None, report_type='delivery', seller_info=None, progress=None):
+    """Render many orders into one PDF (one canvas, one embedded font subset).
+
+    Each order starts on a new page and keeps its own "第 x 页 / 共 y 页" numbering.
+    progress(done, total), if given, is called after each order. Targets are
+    handled as in export_pdf.
+    """
+    target = io.BytesIO() if filepath is None else filepath
+    c = canvas.Canvas(target, pagesize=landscape(A4))
+    fonts = register_fonts()
+    total = len(orders)
+    for idx, order_data in enumerate(orders):
+        _draw_order(c, order_data, report_type, seller_info, fonts)
+        if progress:
+            progress(idx + 1, total)
+    c.save()
+    return _rendered_bytes(target)
+
+
+# Table geometry (landscape A4)
+COL_WIDTHS = [50, 160, 160, 50, 60, 70, 70, 100]
+LEFT_MARGIN = 60
+RIGHT_MARGIN = LEFT_MARGIN + sum(COL_WIDTHS) # Right margin aligned strictly to table width
+HEADERS = ["序号", "商品名称", "规格型号", "单位", "数量", "单价", "合计", "备注"]
+
+# Row layout: rows grow with wrapped text instead of a fixed 35pt / 8 per page
+BODY_FONT_SIZE = 10
+LINE_HEIGHT = 13
+CELL_PADDING_X = 4
+CELL_PADDING_Y = 5       # top + bottom
+MIN_ROW_HEIGHT = LINE_HEIGHT + CELL_PADDING_Y
+TOTAL_ROW_HEIGHT = 22
+FOOTER_GAP = 30          # table bottom -> footer text
+BOTTOM_LIMIT = 55        # lowest table bottom that leaves room for footer and page number
+MIN_ROWS = 5             # orders with <= 5 items are padded to 5 rows
+
+DEFAULT_SELLER = "广州市 XX 办公设备有限公司"
+
+# Bump whenever the drawing code changes what a page looks like; it is part
+# of the PDF cache key (see pdf_cache), so old renders are not reused.
+LAYOUT_VERSION = 2
+
+# Static page furniture is drawn once per canvas as a form XObject and then
+# referenced from every page (see _use_form). Keyed by canvas so forms never
+# leak between documents.
+_canvas_forms = weakref.WeakKeyDictionary()
+
+
+def _use_form(c, key, draw):
+    """Place the form for key on the current page, defining it with draw() on first use."""
+    forms = _canvas_forms.setdefault(c, {})
+    name = forms.get(key)
+    if name is None:
+        name = f"Furniture{len(forms)}"
+        c.beginForm(name)
+        draw()
+        c.endForm()
+        forms[key] = name
+    c.doForm(name)
+
+
+# --- Text measurement ---
+# TrueType widths are additive (reportlab applies no kerning), so a line's
+# width is the sum of its cached per-character widths.
+
+@functools.lru_cache(maxsize=8192)
+def _text_width(text, font, size):
+    return pdfmetrics.stringWidth(text, font, size)
+
+
+@functools.lru_cache(maxsize=8192)
+def _char_width(ch, font, size):
+    return pdfmetrics.stringWidth(ch, font, size)
+
+
+def _wrap(text, max_width, font, size):
+    """Greedy wrap to max_width. Breaks between any characters (CJK) but prefers the last space."""
+    if _text_width(text, font, size) <= max_width and '\n' not in text:
+        return [text]
+
+    lines = []
+    for para in text.split('\n'):
+        line, line_w = '', 0.0
+        for ch in para:
+            w = _char_width(ch, font, size)
+            if line and line_w + w > max_width:
+                cut = line.rfind(' ')
+                if cut > 0:
+                    lines.append(line[:cut])
+                    line = line[cut + 1:]
+                    line_w = sum(_char_width(x, font, size) for x in line)
+                else:
+                    lines.append(line)
+                    line, line_w = '', 0.0
+            line += ch
+            line_w += w
+        lines.append(line)
+    return lines
+
+
+def _row_cells(index, item):
+    """Display strings for one table row."""
+    price = float(item.get('price', 0))
+    return [
+        str(index + 1),
+        item.get('name', ''),
+        item.get('model', ''),
+        item.get('unit', ''),
+        str(item.get('qty', '')),
+        f"{price:.2f}",
+        f"{price * int(item.get('qty', 0)):.2f}",
+        item.get('remark', ''),
+    ]
+
+
+def _layout_row(cells, font, max_height):
+    """Wrap each cell to its column. Returns (lines per cell, row height)."""
+    max_lines = max(1, int((max_height - CELL_PADDING_Y) // LINE_HEIGHT))
+    wrapped = []
+    for w, text in zip(COL_WIDTHS, cells):
+        lines = _wrap(text or '', w - 2 * CELL_PADDING_X, font, BODY_FONT_SIZE)
+        wrapped.append(lines[:max_lines]) # A single row never outgrows a page
+    n_lines = max(len(lines) for lines in wrapped)
+    return wrapped, max(MIN_ROW_HEIGHT, n_lines * LINE_HEIGHT + CELL_PADDING_Y)
+
+
+def _page_breaks(row_heights, avail):
+    """Split rows into pages as densely as they fit.
+
+    Consumes row_heights lazily and returns only the end index of each page,
+    so nothing but the break list is held in memory. The last page must also
+    fit the total row.
+    """
+    breaks = []
+    used = 0.0
+    count = 0
+    n = 0
+    for h in row_heights:
+        if count and used + h > avail:
+            breaks.append(n)
+            used, count = 0.0, 0
+        used += h
+        count += 1
+        n += 1
+    if count > 1 and used + TOTAL_ROW_HEIGHT > avail:
+        # Move the last row over so the total row isn't orphaned
+        breaks.append(n - 1)
+    breaks.append(n)
+    return breaks
+
+
+def _table_geometry(report_type, height):
+    """(header baseline, table top, top of the first body row)."""
+    header_y = height - 125 - 25
+    if report_type == 'delivery':
+        header_y -= 15
+    return header_y, header_y + 12, header_y - 8
+
+
+def _text_baselines(row_top, row_height, n_lines):
+    # Vertically centre the block of lines in the row
+    offset = (row_height - n_lines * LINE_HEIGHT) / 2
+    return [row_top - offset - LINE_HEIGHT * (i + 1) + 3 for i in range(n_lines)]
+
+
+def _draw_header_furniture(c, report_type, seller_name, fonts, width, height):
+    """Titles, info labels, column headers and header rules."""
+    font_reg, font_bold = fonts
+
+    c.setFont(font_bold, 26)
+    c.drawCentredString(width / 2, height - 50, seller_name)
+
+    c.setFont(font_reg, 18)
+    display_title = "销售汇总表" if report_type == 'summary' else "销售出货单"
+    c.drawCentredString(width / 2, height - 85, display_title)
+
+    # Header Info labels; values are drawn per page right after them
+    y_pos = height - 125
+    c.setFont(font_reg, 11)
+    header_right_block_x = width - 240
+    c.drawString(LEFT_MARGIN, y_pos, "客户名称: ")
+    c.drawString(header_right_block_x, y_pos, "单据日期: ")
+    if report_type == 'delivery':
+        y_pos -= 15
+        c.drawString(LEFT_MARGIN, y_pos, "客户地址: ")
+        c.drawString(header_right_block_x, y_pos, "单据编号: ")
+
+    # --- Table Header ---
+    header_y, table_top, body_top = _table_geometry(report_type, height)
+    c.setLineWidth(1)
+    c.line(LEFT_MARGIN, table_top, RIGHT_MARGIN, table_top)
+    c.line(LEFT_MARGIN, body_top, RIGHT_MARGIN, body_top)
+
+    current_x = LEFT_MARGIN
+    for i, h in enumerate(HEADERS):
+        w = COL_WIDTHS[i]
+        c.drawCentredString(current_x + w/2, header_y, h)
+        current_x += w
+
+
+def _draw_column_rules(c):
+    """Frame sides and column lines, one unit tall; _draw_grid stretches them to the table."""
+    c.setLineWidth(1)
+    current_x = LEFT_MARGIN
+    c.line(current_x, 0, current_x, 1)
+    for w in COL_WIDTHS:
+        current_x += w
+        c.line(current_x, 0, current_x, 1)
+
+
+def _draw_total_furniture(c, fonts):
+    """Total row frame and "合计" label, with the row's bottom edge at y=0."""
+    font_reg, _ = fonts
+    c.setLineWidth(1)
+    c.setFont(font_reg, 11)
+
+    # "合计" over cols 0-5, amount (drawn per page) in col 6
+    merged_width = sum(COL_WIDTHS[:6])
+    total_col_start_x = LEFT_MARGIN + merged_width
+    text_y = _text_baselines(TOTAL_ROW_HEIGHT, TOTAL_ROW_HEIGHT, 1)[0]
+    c.drawCentredString(LEFT_MARGIN + merged_width / 2, text_y, "合计")
+    c.line(LEFT_MARGIN, 0, RIGHT_MARGIN, 0)
+    amount_col_end_x = total_col_start_x + COL_WIDTHS[6]
+    for x in (LEFT_MARGIN, total_col_start_x, amount_col_end_x, RIGHT_MARGIN):
+        c.line(x, TOTAL_ROW_HEIGHT, x, 0)
+
+
+def _draw_grid(c, report_type, row_heights, with_total, fonts, height):
+    """Row rules, column lines, the total row frame and footer labels for one page.
+
+    Row rules follow this page's wrapped row heights and are drawn inline; the
+    column lines and total row are document-wide forms positioned per page.
+    """
+    font_reg, _ = fonts
+    _, table_top, y_pos = _table_geometry(report_type, height)
+
+    c.setLineWidth(1)
+
+    # Line at bottom of each row
+    for h in row_heights:
+        y_pos -= h
+        c.line(LEFT_MARGIN, y_pos, RIGHT_MARGIN, y_pos)
+
+    # Vertical lines stop at the last drawn row line. Only the y scale changes,
+    # so the (vertical) strokes keep their width.
+    table_bottom = y_pos
+    if table_bottom < table_top:
+        c.saveState()
+        c.translate(0, table_bottom)
+        c.scale(1, table_top - table_bottom)
+        _use_form(c, ('columns', LEFT_MARGIN, tuple(COL_WIDTHS)), lambda: _draw_column_rules(c))
+        c.restoreState()
+
+    if with_total:
+        table_bottom -= TOTAL_ROW_HEIGHT
+        c.saveState()
+        c.translate(0, table_bottom)
+        _use_form(c, ('total', fonts), lambda: _draw_total_furniture(c, fonts))
+        c.restoreState()
+
+    # Footer labels (maker value is drawn per page)
+    c.setFont(font_reg, 11)
+    footer_y = table_bottom - FOOTER_GAP
+    c.drawString(LEFT_MARGIN, footer_y, "制单人: ")
+    # Align Signer to Total Column (Start of Col 6)
+    c.drawString(LEFT_MARGIN + sum(COL_WIDTHS[:6]), footer_y, "签收人:")
+
+
+def _draw_order(c, order_data, report_type, seller_info, fonts):
+    """Draw every page of one order onto canvas c, ending each with showPage()."""
+    width, height = landscape(A4)
+    font_reg, font_bold = fonts
+    seller_name = seller_info.get('name', DEFAULT_SELLER) if seller_info else DEFAULT_SELLER
     
     raw_items = order_data.get('items', [])
     # Filter out empty items (where name is empty) to prevent "ghost" rows
     items = [i for i in raw_items if i.get('name', '').strip()]
     
-    # Pagination: Max 8 items per page
-    max_rows_per_page = 8
-
-    
-    # Calculate chunks
-    if not items:
-        page_chunks = [[]]
-    else:
-        page_chunks = [items[i:i + max_rows_per_page] for i in range(0, len(items), max_rows_per_page)]
-    
-    total_pages = len(page_chunks)
-    
     # Calculate Grand Total
     grand_total = sum(float(item.get('price', 0)) * int(item.get('qty', 0)) for item in items)
-    
-    for page_idx, page_items in enumerate(page_chunks):
+
+    # --- Pass 1: measure rows and find page breaks (only the breaks are kept) ---
+    _, _, body_top = _table_geometry(report_type, height)
+    avail = body_top - BOTTOM_LIMIT
+    heights = (_layout_row(_row_cells(i, item), font_reg, avail)[1] for i, item in enumerate(items))
+    breaks = _page_breaks(heights, avail)
+    total_pages = len(breaks)
+
+    # Empty Rows (Min 5 rule): pad to 5 rows only when the whole order has <= 5 items
+    pad_to = MIN_ROWS if len(items) <= MIN_ROWS else 0
+
+    label_w = lambda text: _text_width(text, font_reg, 11)
+    header_right_block_x = width - 240
+    total_col_start_x = LEFT_MARGIN + sum(COL_WIDTHS[:6])
+
+    # --- Pass 2: lay out and draw one page at a time ---
+    start = 0
+    for page_idx, end in enumerate(breaks):
         is_last_page = (page_idx == total_pages - 1)
         
-        # --- Draw Header (Same for all pages) ---
-        
-        # Title
-        title_text = "销售出货单"
-        if report_type == 'summary':
-             title_text = "销售汇总单" # Optional: Change title? User didn't ask but "Order Summary" implies it. 
-             # User said "Generate specific customer summary statement". 
-             # But "Table content rules... consistent with 'Opening Order' logic".
-             # "Header... exclude Customer Address and Order ID".
-             # I should probably stick to "销售出货单" unless asked, OR change to "销售汇总表".
-             # Let's keep "销售出货单" or make it dynamic if user asked? User didn't explicitly ask to change Title text.
-             # However, "Order Summary" (订单汇总) allows for a different title.
-             # Let's use "销售汇总单" for summary mode as a polish, or keep "销售出货单".
-             # "Summary Filter Conditions... Manual Modification: Document Date... (2026-01-01 to...)"
-             # Let's keep simple.
-        
-        # Actually, let's keep title "销售出货单" unless I see "Summary" in requirements.
-        # "Generate specific customer summary statement" usually has title "Statement". 
-        # I'll stick to input reqs: "Exclude Address and ID".
-        
-        c.setFont(font_bold, 26) 
-        seller_name = seller_info.get('name', "广州市 XX 办公设备有限公司") if seller_info else "广州市 XX 办公设备有限公司"
-        c.drawCentredString(width / 2, height - 50, seller_name)
-        
-        c.setFont(font_reg, 18)
-        # Dynamic title based on type? Or fixed?
-        # Let's use "销售汇总表" if summary.
-        display_title = "销售汇总表" if report_type == 'summary' else "销售出货单"
-        c.drawCentredString(width / 2, height - 85, display_title)
+        # --- Header (Same for all pages) ---
+        _use_form(c, ('header', report_type, seller_name, fonts),
+                  lambda: _draw_header_furniture(c, report_type, seller_name, fonts, width, height))
 
-        # Header Info - user requested Right Align but with labels aligned
-        y_pos = height - 125
         c.setFont(font_reg, 11)
-        
-        # Calculate Layout Guidelines
-        col_widths = [50, 160, 160, 50, 60, 70, 70, 100] 
-        left_margin = 60
-        # Right margin aligned strictly to table width
-        right_margin = left_margin + sum(col_widths)
-        
-        # Left side: Customer Info
-        c.drawString(left_margin, y_pos, f"客户名称: {order_data.get('customer', '')}")
-        
-        # Right side: Date and ID (Aligned block)
-        # Use simple width-based alignment for text to match previous look, or align to table right?
-        # Let's align to table right (right_margin).
-        # Previous: width - 240. width is usually ~841. right_margin is ~780.
-        # 60 difference.
-        header_right_block_x = width - 240
-        c.drawString(header_right_block_x, y_pos, f"单据日期: {order_data.get('date', '')}")
-        
+        y_pos = height - 125
+        c.drawString(LEFT_MARGIN + label_w("客户名称: "), y_pos, f"{order_data.get('customer', '')}")
+        c.drawString(header_right_block_x + label_w("单据日期: "), y_pos, f"{order_data.get('date', '')}")
         if report_type == 'delivery':
             y_pos -= 15
-            c.drawString(left_margin, y_pos, f"客户地址: {order_data.get('address', '')}")
-            
-            # Right side: Order ID
-            c.drawString(header_right_block_x, y_pos, f"单据编号: {order_data.get('order_id', '')}")
-
-        # --- Table Header ---
-        y_pos -= 25 
-        table_top = y_pos + 12
-        # col_widths defined above
-        headers = ["序号", "商品名称", "规格型号", "单位", "数量", "单价", "合计", "备注"]
-        
-        c.setLineWidth(1)
-        
-        # Margin defined above
-        
-        c.line(left_margin, table_top, right_margin, table_top)
-        c.line(left_margin, y_pos - 8, right_margin, y_pos - 8)
-        
-        current_x = left_margin
-        for i, h in enumerate(headers):
-            w = col_widths[i]
-            c.drawCentredString(current_x + w/2, y_pos, h)
-            current_x += w
+            c.drawString(LEFT_MARGIN + label_w("客户地址: "), y_pos, f"{order_data.get('address', '')}")
+            c.drawString(header_right_block_x + label_w("单据编号: "), y_pos, f"{order_data.get('order_id', '')}")
+
+        rows = [_layout_row(_row_cells(i, items[i]), font_reg, avail) for i in range(start, end)]
+        row_heights = [h for _, h in rows]
+        while len(row_heights) < pad_to and sum(row_heights) + MIN_ROW_HEIGHT + TOTAL_ROW_HEIGHT <= avail:
+            row_heights.append(MIN_ROW_HEIGHT)
+
+        # --- Grid for these row heights ---
+        _draw_grid(c, report_type, row_heights, is_last_page, fonts, height)
 
         # --- Table Content ---
-        row_height = 35
-        y_pos -= row_height
-        
-        # Draw Items for this page
-        start_idx = page_idx * max_rows_per_page
-        
-        for idx, item in enumerate(page_items):
-            global_idx = start_idx + idx
-            
-            current_x = left_margin
-            text_y = y_pos + 12 
-            
-            c.drawCentredString(current_x + col_widths[0]/2, text_y, str(global_idx + 1))
-            current_x += col_widths[0]
-            
-            c.drawCentredString(current_x + col_widths[1]/2, text_y, item.get('name', ''))
-            current_x += col_widths[1]
-            
-            c.drawCentredString(current_x + col_widths[2]/2, text_y, item.get('model', ''))
-            current_x += col_widths[2]
-            
-            c.drawCentredString(current_x + col_widths[3]/2, text_y, item.get('unit', ''))
-            current_x += col_widths[3]
-            
-            c.drawCentredString(current_x + col_widths[4]/2, text_y, str(item.get('qty', '')))
-            current_x += col_widths[4]
-            
-            c.drawCentredString(current_x + col_widths[5]/2, text_y, f"{float(item.get('price', 0)):.2f}")
-            current_x += col_widths[5]
-            
-            line_total = float(item.get('price', 0)) * int(item.get('qty', 0))
-            c.drawCentredString(current_x + col_widths[6]/2, text_y, f"{line_total:.2f}")
-            current_x += col_widths[6]
-            
-            c.drawCentredString(current_x + col_widths[7]/2, text_y, item.get('remark', ''))
-            current_x += col_widths[7]
-            
-            # Line at bottom of row
-            c.line(left_margin, y_pos, right_margin, y_pos)
-            y_pos -= row_height
-
-        # --- Empty Rows (Min 5 rule) ---
-        # Only pad if total items <= 5. 
-        # If items > 5, we do NOT pad, even if on last page with 1 item?
-        # User said: "Insufficient 5 lines automatic make up logic stays unchanged, that is normal".
-        # Current logic: if len(items) > 5: min_rows = 0.
-        # This means if I have 20 items. Page 3 has 4 items.
-        # len(items) = 20 > 5. min_rows = 0.
-        # rows_on_page = 4. 4 < 0 is False. No padding.
-        # So Page 3 has 4 items and STOPS.
-        # This seems to be what is intended.
-        
-        if len(items) > 5:
-            min_rows = 0
-        else:
-            min_rows = 5
-            
-        rows_on_this_page = len(page_items)
-        
-        target_rows = min_rows if rows_on_this_page < min_rows else rows_on_this_page
-        
-        while rows_on_this_page < target_rows:
-            c.line(left_margin, y_pos, right_margin, y_pos)
-            y_pos -= row_height
-            rows_on_this_page += 1
-
-        # Table Bottom Position (used for vertical lines)
-        # y_pos is currently "one row height" BELOW the last drawn line.
-        # We want vertical lines to stop at the last drawn line.
-        table_bottom = y_pos + row_height
-        
-        # --- Draw Vertical Lines for Table Body ---
-        current_x = left_margin
-        c.line(current_x, table_top, current_x, table_bottom)
-        for w in col_widths:
-            current_x += w
-            c.line(current_x, table_top, current_x, table_bottom)
-
-        # --- Total Row (Only on Last Page) ---
+        c.setFont(font_reg, BODY_FONT_SIZE)
+        row_top = body_top
+        for wrapped, row_h in rows:
+            current_x = LEFT_MARGIN
+            for w, lines in zip(COL_WIDTHS, wrapped):
+                for line, text_y in zip(lines, _text_baselines(row_top, row_h, len(lines))):
+                    c.drawCentredString(current_x + w/2, text_y, line)
+                current_x += w
+            row_top -= row_h
+
+        table_bottom = body_top - sum(row_heights)
+        c.setFont(font_reg, 11)
+
+        # --- Total Row value (Only on Last Page) ---
         if is_last_page:
-            # Total Row
-            # We append it below the current table_bottom.
-            # So Top of Total Row = table_bottom
-            # Bottom of Total Row = y_pos (which is table_bottom - row_height)
-            
-            text_y = y_pos + 12
-            
-            # Calculate center of the merged block (Cols 0-5)
-            merged_width = sum(col_widths[:6])
-            merged_center_x = left_margin + (merged_width / 2)
-            c.drawCentredString(merged_center_x, text_y, "合计")
-            
-            # Value in "Total" column (Index 6)
-            total_col_start_x = left_margin + merged_width
-            c.drawCentredString(total_col_start_x + col_widths[6]/2, text_y, f"{grand_total:.2f}")
-            
-            # Bottom line of Total Row
-            c.line(left_margin, y_pos, right_margin, y_pos)
-            
-            # --- Vertical Lines for Total Row ---
-            # 1. Left border
-            c.line(left_margin, table_bottom, left_margin, y_pos)
-            
-            # 2. Line before Amount (Start of col 6)
-            c.line(total_col_start_x, table_bottom, total_col_start_x, y_pos)
-            
-            # 3. Line after Amount (End of col 6 / Start of Remark)
-            amount_col_end_x = total_col_start_x + col_widths[6]
-            c.line(amount_col_end_x, table_bottom, amount_col_end_x, y_pos)
-            
-            # 4. Right border
-            c.line(right_margin, table_bottom, right_margin, y_pos)
-            
-            # Update table_bottom so footer is relative to this new bottom
-            table_bottom = y_pos
+            text_y = _text_baselines(table_bottom, TOTAL_ROW_HEIGHT, 1)[0]
+            c.drawCentredString(total_col_start_x + COL_WIDTHS[6]/2, text_y, f"{grand_total:.2f}")
+            table_bottom -= TOTAL_ROW_HEIGHT
 
         # --- Footer (On Every Page) ---
-        footer_y = table_bottom - 40
-        
-        c.drawString(left_margin, footer_y, f"制单人: {order_data.get('maker', '')}")
-        
-        # Align Signer to Total Column (Start of Col 6)
-        total_col_start_x = left_margin + sum(col_widths[:6])
-        c.drawString(total_col_start_x, footer_y, "签收人:")
+        footer_y = table_bottom - FOOTER_GAP
+        c.drawString(LEFT_MARGIN + label_w("制单人: "), footer_y, f"{order_data.get('maker', '')}")
         
         # Page Number
         c.drawCentredString(width/2, 10, f"- 第 {page_idx + 1} 页 / 共 {total_pages} 页 -")
 
         c.showPage()
-        
-    c.save()
+        start = end
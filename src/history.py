@@ -2,14 +2,179 @@ import json
 import os
 import datetime
 import sys
-from openpyxl import Workbook
+import bisect
+import threading
+import csv
 
 from logic import BASE_DIR
+import persistence
+import debug_utils
 ORDERS_FILE = os.path.join(BASE_DIR, 'orders.json')
+# Append-only log of changes made since orders.json was last written.
+# orders.json stays a plain list so older versions can still read it.
+JOURNAL_FILE = os.path.join(BASE_DIR, 'orders.journal.jsonl')
+
+# Fold the journal back into orders.json after this many entries
+COMPACT_THRESHOLD = 200
+
+
+SUMMARY_HEADERS = ["单据编号", "日期", "客户名称", "商品名称", "规格型号", "数量", "单位", "单价", "金额", "备注", "制单人"]
+
+
+def _summary_rows(orders):
+    """Yield (order, row) for every line item, one at a time."""
+    for order in orders:
+        base_info = [
+            order.get('order_id'),
+            order.get('date'),
+            order.get('customer'),
+        ]
+        maker = order.get('maker', '')
+
+        for item in order.get('items', []):
+            yield order, base_info + [
+                item.get('name'),
+                item.get('model'),
+                item.get('qty'),
+                item.get('unit'),
+                item.get('price'),
+                item.get('total'),
+                item.get('remark'),
+                maker
+            ]
+
+
+def _month_of(order):
+    # Sheet title for the per-month split: "2026-01", or "其他" for bad dates
+    date = order.get('date') or ''
+    if len(date) >= 7 and date[4] == '-' and date[:4].isdigit() and date[5:7].isdigit():
+        return date[:7]
+    return "其他"
+
+
+class _SortedOrders:
+    """Orders kept sorted by date so date ranges are a bisect, not a scan."""
 
-class HistoryManager:
     def __init__(self):
+        self.dates = []
+        self.keys = []
         self.orders = []
+
+    def add(self, key, order):
+        i = bisect.bisect_right(self.keys, key)
+        self.dates.insert(i, key[0])
+        self.keys.insert(i, key)
+        self.orders.insert(i, order)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.dates[i]
+            del self.keys[i]
+            del self.orders[i]
+
+    def range(self, start_date=None, end_date=None):
+        """(keys, orders) with start_date <= date <= end_date, oldest first."""
+        lo = bisect.bisect_left(self.dates, start_date) if start_date else 0
+        hi = bisect.bisect_right(self.dates, end_date) if end_date else len(self.dates)
+        return self.keys[lo:hi], self.orders[lo:hi]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def _search_texts(order):
+    """Lowercased fields the history keyword filter looks at."""
+    yield (order.get('order_id') or '').lower()
+    yield (order.get('customer') or '').lower()
+    for item in order.get('items', []):
+        yield (item.get('name') or '').lower()
+        yield (item.get('remark') or '').lower()
+
+
+class _KeywordIndex:
+    """Inverted index from character unigrams/bigrams to order serials.
+
+    Bigrams suit CJK names like "青色碳粉" that have no word boundaries. Any
+    substring of 2+ characters is found by intersecting its bigram postings;
+    the result is a superset, so callers still confirm with a substring check.
+    """
+
+    def __init__(self):
+        self.postings = {}
+
+    @staticmethod
+    def _grams(text):
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def _order_grams(self, order):
+        grams = set()
+        for text in _search_texts(order):
+            grams |= self._grams(text)
+        return grams
+
+    def add(self, serial, order):
+        for gram in self._order_grams(order):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = set()
+            posting.add(serial)
+
+    def remove(self, serial, order):
+        for gram in self._order_grams(order):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(serial)
+                if not posting:
+                    del self.postings[gram]
+
+    def lookup(self, kw):
+        """Serials of orders that may contain kw (already lowercased)."""
+        if len(kw) == 1:
+            return set(self.postings.get(kw, ()))
+
+        postings = []
+        for gram in {kw[i:i + 2] for i in range(len(kw) - 1)}:
+            posting = self.postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+
+        # Smallest first keeps every intersection step cheap
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+
+class HistoryManager:
+    def __init__(self, storage='journal'):
+        # storage: 'journal' appends one line per change and compacts periodically,
+        # 'json' rewrites the whole orders.json on every change (legacy behaviour).
+        self.storage = storage
+        self.orders = []
+        self._journal_entries = 0
+
+        # Disk writes happen on the persistence writer thread. save/delete only
+        # queue journal lines (or flag a snapshot) under this lock.
+        self._lock = threading.Lock()
+        self._journal_buffer = []
+        self._snapshot_due = False
+
+        # Secondary indexes, kept in step with self.orders
+        self._next_serial = 0
+        self._key_of = {}        # id(order) -> sort key
+        self._by_id = {}         # order_id -> order
+        self._by_customer = {}   # casefolded customer -> _SortedOrders
+        self._by_date = _SortedOrders()
+        self._by_serial = {}     # serial -> order, for keyword postings
+        self._keywords = _KeywordIndex()
+
         self.load_orders()
 
     def load_orders(self):
@@ -23,94 +188,331 @@ class HistoryManager:
         else:
             self.orders = []
 
-    def save_order(self, order_data):
-        # unique check?
-        self.orders.append(order_data)
-        self._persist()
+        # Replay whatever was appended after the last snapshot.
+        # Done in both modes so switching back to 'json' never loses orders.
+        needs_compact = self._replay_journal()
+        if needs_compact or (self.storage != 'journal' and self._journal_entries):
+            self.compact()
+
+        self._rebuild_indexes()
+
+    def _sort_key(self, order):
+        # Sorted ascending and read back reversed, so the negative serial keeps
+        # orders with equal (date, order_id) in insertion order, like a stable sort.
+        self._next_serial += 1
+        return (order.get('date') or '', order.get('order_id') or '', -self._next_serial)
+
+    def _rebuild_indexes(self):
+        self._next_serial = 0
+        self._key_of = {}
+        self._by_id = {}
+        self._by_customer = {}
+        self._by_serial = {}
+        self._keywords = _KeywordIndex()
+
+        entries = []
+        for order in self.orders:
+            key = self._sort_key(order)
+            self._key_of[id(order)] = key
+            self._by_id[order.get('order_id')] = order
+            self._by_serial[-key[2]] = order
+            self._keywords.add(-key[2], order)
+            entries.append((key, order))
+
+        # One sort instead of an insort per order
+        entries.sort(key=lambda e: e[0])
+        self._by_date = _SortedOrders()
+        self._by_date.keys = [k for k, _ in entries]
+        self._by_date.dates = [k[0] for k in self._by_date.keys]
+        self._by_date.orders = [o for _, o in entries]
+
+        for key, order in entries:
+            cust = (order.get('customer') or '').casefold()
+            index = self._by_customer.get(cust)
+            if index is None:
+                index = self._by_customer[cust] = _SortedOrders()
+            index.keys.append(key)
+            index.dates.append(key[0])
+            index.orders.append(order)
+
+    def _index_order(self, order):
+        key = self._sort_key(order)
+        self._key_of[id(order)] = key
+        self._by_id[order.get('order_id')] = order
+        self._by_serial[-key[2]] = order
+        self._keywords.add(-key[2], order)
+        self._by_date.add(key, order)
+        cust = (order.get('customer') or '').casefold()
+        index = self._by_customer.get(cust)
+        if index is None:
+            index = self._by_customer[cust] = _SortedOrders()
+        index.add(key, order)
+
+    def _unindex_order(self, order):
+        key = self._key_of.pop(id(order), None)
+        if key is None:
+            return
+        if self._by_id.get(order.get('order_id')) is order:
+            del self._by_id[order.get('order_id')]
+        del self._by_serial[-key[2]]
+        self._keywords.remove(-key[2], order)
+        self._by_date.remove(key)
+        cust = (order.get('customer') or '').casefold()
+        index = self._by_customer.get(cust)
+        if index is not None:
+            index.remove(key)
+            if not len(index):
+                del self._by_customer[cust]
+
+    def get_order(self, order_id):
+        """Look up a single order by its order_id (None if unknown)."""
+        return self._by_id.get(order_id)
+
+    def orders_after(self, watermark=None):
+        """Orders whose (date, order_id) sorts after watermark, oldest first.
+
+        watermark is a [date, order_id] pair (None means all orders). Re-saves
+        of one order come back in the order they were saved.
+        """
+        keys, orders = self._by_date.keys, self._by_date.orders
+        start = 0
+        if watermark:
+            # Serials are negative, so 0 sorts after every key for that (date, order_id)
+            start = bisect.bisect_right(keys, (watermark[0], watermark[1], 0))
+        tail = sorted(zip(keys[start:], orders[start:]), key=lambda e: (e[0][0], e[0][1], -e[0][2]))
+        return [o for _, o in tail]
+
+    def _replay_journal(self):
+        """Apply journal entries on top of the snapshot. Returns True if the journal was damaged."""
+        self._journal_entries = 0
+        if not os.path.exists(JOURNAL_FILE):
+            return False
+
+        damaged = False
+        # Orders already in the snapshot, so a journal left behind by an
+        # interrupted compaction does not duplicate them.
+        known = {}
+        for o in self.orders:
+            known.setdefault(o.get('order_id'), []).append(o)
 
-    def _persist(self):
         try:
-            with open(ORDERS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.orders, f, indent=2, ensure_ascii=False)
+            with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write (e.g. power loss mid-append). Keep the rest.
+                        print("Skipping damaged journal line")
+                        damaged = True
+                        continue
+
+                    op = entry.get('op')
+                    if op == 'save':
+                        order = entry.get('order', {})
+                        same_id = known.setdefault(order.get('order_id'), [])
+                        if order not in same_id:
+                            self.orders.append(order)
+                            same_id.append(order)
+                    elif op == 'delete':
+                        ids = set(entry.get('order_ids', []))
+                        self.orders = [o for o in self.orders if o.get('order_id') not in ids]
+                        for oid in ids:
+                            known.pop(oid, None)
+                    self._journal_entries += 1
         except Exception as e:
-            print(f"Error saving orders: {e}")
+            print(f"Error replaying order journal: {e}")
+            damaged = True
+
+        return damaged
+
+    def save_order(self, order_data):
+        # unique check?
+        with self._lock:
+            self.orders.append(order_data)
+            self._index_order(order_data)
+            if self.storage == 'journal':
+                self._append_journal({"op": "save", "order": order_data})
+            else:
+                self._snapshot_due = True
+        self._schedule_write()
+
+    def _append_journal(self, entry):
+        # Serialized now, so later edits to the dict cannot change what was saved
+        self._journal_buffer.append(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal_entries += 1
+        if self._journal_entries >= COMPACT_THRESHOLD:
+            self._snapshot_due = True
+
+    def compact(self):
+        """Write the full order list to orders.json and empty the journal."""
+        with self._lock:
+            self._snapshot_due = True
+        self._schedule_write()
+
+    def _schedule_write(self):
+        persistence.schedule(ORDERS_FILE, self._write_pending)
+
+    def _write_pending(self):
+        """Runs on the writer thread: append queued journal lines or write a snapshot."""
+        with self._lock:
+            lines = self._journal_buffer
+            self._journal_buffer = []
+            snapshot = list(self.orders) if self._snapshot_due else None
+            if snapshot is not None:
+                self._snapshot_due = False
+                self._journal_entries = 0
+
+        error = None
+        if snapshot is not None:
+            try:
+                persistence.atomic_write_json(ORDERS_FILE, snapshot, indent=2, ensure_ascii=False)
+            except Exception as e:
+                print(f"Error saving orders: {e}")
+                error = e
+                # Keep the changes in the journal instead, and snapshot again next time
+                with self._lock:
+                    self._journal_entries += len(lines)
+                    self._snapshot_due = True
+            else:
+                # The snapshot already holds every queued line; anything queued
+                # since is still in the buffer for the next write.
+                if os.path.exists(JOURNAL_FILE):
+                    os.remove(JOURNAL_FILE)
+                return
+
+        if lines:
+            try:
+                with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+            except Exception as e:
+                # Journal unusable (read-only share, etc.): keep the lines for the
+                # next write and fall back to a full rewrite, which holds them too
+                print(f"Error appending to order journal: {e}")
+                with self._lock:
+                    self._journal_buffer[:0] = lines
+                    self._snapshot_due = True
+                if snapshot is None:
+                    self._schedule_write() # try the rewrite once now; after that, on the next write
+                raise
+        elif error is not None:
+            # Nothing of this write reached disk; let the writer report it
+            raise error
 
     def get_orders(self, start_date=None, end_date=None, keyword="", customer_name=""):
         # dates are YYYY-MM-DD strings
-        filtered = []
-        for order in self.orders:
-            o_date = order.get('date', '')
-            
-            # Date filter
-            if start_date and o_date < start_date:
-                continue
-            if end_date and o_date > end_date:
-                continue
-                
-            # Customer Name filter
-            if customer_name:
-                # Exact match required
-                if customer_name.lower() != order.get('customer', '').lower():
-                    continue
-
-            # Keyword filter (search in customer name, order id, or remark)
-            if keyword:
-                kw = keyword.lower()
-                found = False
-                if kw in order.get('order_id', '').lower(): found = True
-                if kw in order.get('customer', '').lower(): found = True
-                # Check items for remarks or names
-                for item in order.get('items', []):
-                     if kw in item.get('name', '').lower(): found = True
-                     if kw in item.get('remark', '').lower(): found = True
-                if not found:
-                    continue
-            
-            filtered.append(order)
-            
-        # Sort by date desc, then ID desc
-        filtered.sort(key=lambda x: (x.get('date', ''), x.get('order_id', '')), reverse=True)
-        return filtered
+        # Customer filter (exact, case-insensitive) narrows to that customer's own
+        # date index; otherwise the global date index is used.
+        if customer_name:
+            index = self._by_customer.get(customer_name.casefold())
+            if index is None:
+                return []
+        else:
+            index = self._by_date
+
+        keys, candidates = index.range(start_date, end_date)
+
+        # Keyword filter (search in customer name, order id, or remark)
+        if keyword:
+            kw = keyword.lower()
+            hits = self._keywords.lookup(kw)
+            if len(hits) < len(keys):
+                # Keyword is the more selective side: walk its postings and
+                # apply the date/customer filters to those few orders only.
+                cust = customer_name.casefold() if customer_name else None
+                matched = []
+                for serial in hits:
+                    order = self._by_serial[serial]
+                    key = self._key_of[id(order)]
+                    if start_date and key[0] < start_date:
+                        continue
+                    if end_date and key[0] > end_date:
+                        continue
+                    if cust is not None and (order.get('customer') or '').casefold() != cust:
+                        continue
+                    if self._matches_keyword(order, kw):
+                        matched.append((key, order))
+                matched.sort(key=lambda e: e[0], reverse=True)
+                return [o for _, o in matched]
+
+            candidates = [
+                o for k, o in zip(keys, candidates)
+                if -k[2] in hits and self._matches_keyword(o, kw)
+            ]
+
+        # Index is ascending; callers expect date desc, then ID desc
+        candidates.reverse()
+        return candidates
+
+    def _matches_keyword(self, order, kw):
+        # Postings only guarantee every bigram occurs somewhere in the order;
+        # confirm the keyword is a substring of a single field.
+        for text in _search_texts(order):
+            if kw in text:
+                return True
+        return False
 
     def delete_orders(self, order_ids):
         """Delete orders by a list of order_ids."""
-        initial_count = len(self.orders)
-        self.orders = [o for o in self.orders if o.get('order_id') not in order_ids]
-        if len(self.orders) < initial_count:
-            self._persist()
-        return initial_count - len(self.orders)
-
-    def export_summary_to_excel(self, orders, filename):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "销售汇总"
-        
-        headers = ["单据编号", "日期", "客户名称", "商品名称", "规格型号", "数量", "单位", "单价", "金额", "备注", "制单人"]
-        ws.append(headers)
-        
-        for order in orders:
-            base_info = [
-                order.get('order_id'),
-                order.get('date'),
-                order.get('customer'),
-            ]
-            maker = order.get('maker', '')
-            
-            for item in order.get('items', []):
-                row = base_info + [
-                    item.get('name'),
-                    item.get('model'),
-                    item.get('qty'),
-                    item.get('unit'),
-                    item.get('price'),
-                    item.get('total'),
-                    item.get('remark'),
-                    maker
-                ]
-                ws.append(row)
-                
+        ids = set(order_ids)
+        with self._lock:
+            initial_count = len(self.orders)
+            kept = []
+            for o in self.orders:
+                if o.get('order_id') in ids:
+                    self._unindex_order(o)
+                else:
+                    kept.append(o)
+            self.orders = kept
+            deleted = initial_count - len(self.orders)
+            if deleted:
+                if self.storage == 'journal':
+                    self._append_journal({"op": "delete", "order_ids": list(ids)})
+                else:
+                    self._snapshot_due = True
+        if deleted:
+            self._schedule_write()
+        return deleted
+
+    def export_summary_to_excel(self, orders, filename, split_by_month=False):
+        """Stream one row per line item into a write-only workbook.
+
+        Rows are written as they are produced, so memory stays flat however
+        long the history is. With split_by_month, each month (by order date)
+        gets its own sheet, in the order the months first appear.
+        """
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        sheets = {}
+
+        def sheet_for(title):
+            ws = sheets.get(title)
+            if ws is None:
+                ws = sheets[title] = wb.create_sheet(title)
+                ws.append(SUMMARY_HEADERS)
+            return ws
+
+        for order, row in _summary_rows(orders):
+            title = _month_of(order) if split_by_month else "销售汇总"
+            sheet_for(title).append(row)
+
+        if not sheets:
+            sheet_for("销售汇总")   # a workbook needs at least one sheet
         wb.save(filename)
 
+    def export_summary_to_csv(self, orders, filename, delimiter=','):
+        """Same rows as the Excel summary, as CSV (or TSV with delimiter='\\t').
+
+        Written with a BOM so Excel opens the Chinese text correctly.
+        """
+        with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(SUMMARY_HEADERS)
+            writer.writerows(row for _, row in _summary_rows(orders))
+
     def get_unique_customers(self):
         """Return a sorted list of unique customer names from history."""
         customers = set()
@@ -119,3 +521,22 @@ class HistoryManager:
             if c:
                 customers.add(c)
         return sorted(list(customers))
+
+
+def create_history_manager(storage='journal'):
+    """Return the history backend selected by the 'history_storage' config value."""
+    if storage == 'sqlite':
+        db_file = os.path.join(BASE_DIR, 'orders.db')
+        db_existed = os.path.exists(db_file)
+        try:
+            from history_sqlite import SQLiteHistoryManager
+            return SQLiteHistoryManager()
+        except Exception as e:
+            if db_existed:
+                # orders.json stopped receiving orders when the database imported it;
+                # falling back would show stale history and split new orders across stores
+                debug_utils.log(f"Opening {db_file} failed: {e}")
+                raise RuntimeError(f"无法打开 {db_file} / Could not open the order database: {e}") from e
+            debug_utils.log(f"SQLite history unavailable, falling back to JSON: {e}")
+            storage = 'journal'
+    return HistoryManager(storage=storage)
@@ -0,0 +1,277 @@
+import json
+import os
+import sqlite3
+import threading
+
+from logic import BASE_DIR
+from history import HistoryManager, ORDERS_FILE, JOURNAL_FILE, _search_texts
+import debug_utils
+
+DB_FILE = os.path.join(BASE_DIR, 'orders.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL DEFAULT '',
+    customer TEXT NOT NULL DEFAULT '',
+    customer_key TEXT NOT NULL DEFAULT '',
+    address TEXT,
+    maker TEXT,
+    total REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(date, order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_key, date, order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    id INTEGER PRIMARY KEY,
+    order_ref INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    seq INTEGER,
+    name TEXT,
+    model TEXT,
+    unit TEXT,
+    qty REAL,
+    price REAL,
+    total REAL,
+    remark TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_ref);
+
+CREATE TABLE IF NOT EXISTS order_grams (
+    gram TEXT NOT NULL,
+    order_ref INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    PRIMARY KEY (gram, order_ref)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_order_grams_order ON order_grams(order_ref);
+"""
+
+# user_version once the legacy JSON history has been imported
+SCHEMA_VERSION = 1
+
+
+def _num(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _order_bigrams(order):
+    """Distinct character bigrams of the fields keyword search looks at.
+
+    The trigram index can't serve 1-2 character keywords, and most Chinese
+    customer and product searches are 2 characters; order_grams answers those.
+    """
+    grams = set()
+    for text in _search_texts(order):
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class SQLiteHistoryManager(HistoryManager):
+    """Order history stored in orders.db. Same public API as HistoryManager."""
+
+    def __init__(self, db_path=DB_FILE):
+        self.storage = 'sqlite'
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._fts = self._create_search_table()
+        self.load_orders()
+
+    def _create_search_table(self):
+        # item_search mirrors order_items (rowid = order_items.id) with lowercased
+        # name/remark. FTS5 trigram gives indexed substring search, CJK included.
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS item_search "
+                "USING fts5(name, remark, tokenize='trigram')"
+            )
+            return True
+        except sqlite3.OperationalError as e:
+            # Old SQLite without FTS5/trigram: plain table, keyword search scans it
+            debug_utils.log(f"FTS5 trigram unavailable, using plain search table: {e}")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS item_search (name TEXT, remark TEXT)"
+            )
+            return False
+
+    def load_orders(self):
+        """Import orders.json (+ journal) the first time the database is opened."""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        if os.path.exists(ORDERS_FILE) or os.path.exists(JOURNAL_FILE):
+            legacy = HistoryManager(storage='journal')
+            with self._lock, self.conn:
+                for order in legacy.orders:
+                    self._insert(order)
+            debug_utils.log(f"Imported {len(legacy.orders)} orders into {self.db_path}")
+
+        with self._lock:
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
+
+    @property
+    def orders(self):
+        """All orders in insertion order (full read; prefer get_orders)."""
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM orders ORDER BY id").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def _insert(self, order):
+        customer = order.get('customer') or ''
+        cur = self.conn.execute(
+            "INSERT INTO orders (order_id, date, customer, customer_key, address, maker, total, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                order.get('order_id') or '',
+                order.get('date') or '',
+                customer,
+                customer.casefold(),
+                order.get('address'),
+                order.get('maker'),
+                _num(order.get('total')),
+                json.dumps(order, ensure_ascii=False),
+            ),
+        )
+        order_ref = cur.lastrowid
+        self._insert_grams(order_ref, order)
+
+        for seq, item in enumerate(order.get('items', [])):
+            name = item.get('name') or ''
+            remark = item.get('remark') or ''
+            cur = self.conn.execute(
+                "INSERT INTO order_items (order_ref, seq, name, model, unit, qty, price, total, remark) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    order_ref, seq, name, item.get('model'), item.get('unit'),
+                    _num(item.get('qty')), _num(item.get('price')), _num(item.get('total')), remark,
+                ),
+            )
+            self.conn.execute(
+                "INSERT INTO item_search (rowid, name, remark) VALUES (?, ?, ?)",
+                (cur.lastrowid, name.lower(), remark.lower()),
+            )
+
+    def _insert_grams(self, order_ref, order):
+        self.conn.executemany(
+            "INSERT INTO order_grams (gram, order_ref) VALUES (?, ?)",
+            ((gram, order_ref) for gram in _order_bigrams(order)),
+        )
+
+    def save_order(self, order_data):
+        with self._lock, self.conn:
+            self._insert(order_data)
+
+    def compact(self):
+        pass
+
+    def get_orders(self, start_date=None, end_date=None, keyword="", customer_name=""):
+        sql = "SELECT data FROM orders WHERE 1=1"
+        params = []
+
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(end_date)
+        if customer_name:
+            sql += " AND customer_key = ?"
+            params.append(customer_name.casefold())
+
+        if keyword:
+            kw = keyword.lower()
+            if len(kw) == 2:
+                # A 2-character keyword is one bigram, so its postings are exactly the matches
+                sql += " AND id IN (SELECT order_ref FROM order_grams WHERE gram = ?)"
+                params.append(kw)
+            elif self._fts and len(kw) >= 3:
+                # Trigram index; quote as a phrase
+                sql += (
+                    " AND (instr(lower(order_id), ?) > 0 OR instr(customer_key, ?) > 0"
+                    " OR id IN (SELECT order_ref FROM order_items WHERE id IN ("
+                    "SELECT rowid FROM item_search WHERE item_search MATCH ?)))"
+                )
+                params.extend([kw, keyword.casefold(), '"' + kw.replace('"', '""') + '"'])
+            else:
+                if len(kw) >= 3:
+                    # No FTS5: orders holding every bigram of kw, confirmed below
+                    bigrams = sorted({kw[i:i + 2] for i in range(len(kw) - 1)})
+                    sql += " AND id IN (" + " INTERSECT ".join(
+                        ["SELECT order_ref FROM order_grams WHERE gram = ?"] * len(bigrams)
+                    ) + ")"
+                    params.extend(bigrams)
+                # Single characters are not indexed and scan
+                sql += (
+                    " AND (instr(lower(order_id), ?) > 0 OR instr(customer_key, ?) > 0"
+                    " OR EXISTS (SELECT 1 FROM order_items i JOIN item_search s ON s.rowid = i.id"
+                    " WHERE i.order_ref = orders.id AND (instr(s.name, ?) > 0 OR instr(s.remark, ?) > 0)))"
+                )
+                params.extend([kw, keyword.casefold(), kw, kw])
+
+        # Same order as the JSON backend: date desc, then ID desc
+        sql += " ORDER BY date DESC, order_id DESC, id ASC"
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_order(self, order_id):
+        """Look up a single order by its order_id (None if unknown); the latest save wins."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM orders WHERE order_id = ? ORDER BY id DESC LIMIT 1", (order_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def orders_after(self, watermark=None):
+        """Orders whose (date, order_id) sorts after watermark, oldest first."""
+        sql = "SELECT data FROM orders"
+        params = []
+        if watermark:
+            sql += " WHERE date > ? OR (date = ? AND order_id > ?)"
+            params = [watermark[0], watermark[0], watermark[1]]
+        sql += " ORDER BY date, order_id, id"
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def delete_orders(self, order_ids):
+        """Delete orders by a list of order_ids."""
+        ids = list(order_ids)
+        if not ids:
+            return 0
+
+        placeholders = ",".join("?" * len(ids))
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM item_search WHERE rowid IN ("
+                "SELECT i.id FROM order_items i JOIN orders o ON o.id = i.order_ref "
+                "WHERE o.order_id IN (" + placeholders + "))",
+                ids,
+            )
+            cur = self.conn.execute(
+                "DELETE FROM orders WHERE order_id IN (" + placeholders + ")", ids
+            )
+        return cur.rowcount
+
+    def get_unique_customers(self):
+        """Return a sorted list of unique customer names from history."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT customer FROM orders WHERE customer != '' ORDER BY customer"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
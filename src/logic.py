@@ -3,6 +3,7 @@ import os
 import datetime
 import sys
 import debug_utils
+import persistence
 
 # Paths to data files
 if getattr(sys, 'frozen', False):
@@ -64,9 +65,96 @@ PRODUCTS_FILE = os.path.join(BASE_DIR, 'products.json')
 CUSTOMERS_FILE = os.path.join(BASE_DIR, 'customers.json')
 CONFIG_FILE = os.path.join(BASE_DIR, 'config.json')
 
+# Excel imports stream rows and hand them to the batch upsert this many at a time
+IMPORT_CHUNK_SIZE = 1000
+
+# Accepted header texts (lowercase) for each imported field
+CUSTOMER_COLUMNS = {
+    'name': ['客户名称', 'customer', 'name', '姓名', '客户'],
+    'address': ['客户地址', 'address', '地址'],
+}
+PRODUCT_COLUMNS = {
+    'name': ['商品名称', 'name', '品名'],
+    'model': ['规格型号', 'model', '型号'],
+    'machine_model': ['适用机型', 'machine', 'machine_model', '机型'],
+    'unit': ['单位', 'unit'],
+    'price': ['参考单价', '单价', 'price'],
+}
+
+
+def _read_excel_chunks(filepath, aliases, missing_name_error, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Stream the first sheet of filepath in read-only mode.
+
+    aliases maps a field to the header texts (lowercase) that name its column.
+    Yields lists of at most chunk_size {field: value} dicts, one per row
+    after the header, so memory stays flat however big the file is.
+    progress(rows_read, total) is called after each chunk; total comes from
+    the file's own dimension record and is None when it is missing.
+    Raises ValueError(missing_name_error) if there is no 'name' column.
+    """
+    import openpyxl
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        sheet = wb.active
+        total = sheet.max_row - 1 if sheet.max_row else None
+        # Some writers record a wrong size; read every row that is really there
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+
+        columns = {}
+        for idx, value in enumerate(next(rows, ())):
+            val = str(value).strip().lower() if value else ""
+            for field, names in aliases.items():
+                if val in names:
+                    columns[field] = idx
+        if 'name' not in columns:
+            raise ValueError(missing_name_error)
+
+        chunk = []
+        read = 0
+        for row in rows:
+            read += 1
+            # Rows are not padded once the dimensions are reset
+            chunk.append({f: (row[i] if i < len(row) else None) for f, i in columns.items()})
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+                if progress:
+                    progress(read, max(total, read) if total else None)
+        if chunk:
+            yield chunk
+        if progress:
+            progress(read, read)
+    finally:
+        wb.close()
+
+
+def _price(value):
+    # Stored prices may be numbers or strings from older files
+    try:
+        return round(float(value or 0), 6)
+    except (TypeError, ValueError):
+        return value
+
+
+def _product_change(old_p, new_p):
+    """How new_p differs from the stored old_p: 'field_changed', 'price_changed' or None.
+
+    Only the fields new_p brings are compared.
+    """
+    if any(k != 'price' and old_p.get(k) != v for k, v in new_p.items()):
+        return 'field_changed'
+    if 'price' in new_p and _price(old_p.get('price')) != _price(new_p['price']):
+        return 'price_changed'
+    return None
+
+
 class CustomerManager:
     def __init__(self):
         self.customers = []
+        self._by_name = {}   # name -> customer dict
+        self.revision = 0    # bumped on every add/update; see apply_history_addresses
+        self._changed_at = {}  # name -> revision of its last add/update
         self.load_customers()
 
     def load_customers(self):
@@ -80,109 +168,190 @@ class CustomerManager:
                 self.customers = []
         else:
             self.customers = []
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._by_name = {}
+        for c in self.customers:
+            self._by_name.setdefault(c['name'], c)
 
     def save_customers(self):
-        try:
-            with open(CUSTOMERS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.customers, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            debug_utils.log(f"Error saving customers: {e}")
+        # Written by the background writer; repeated calls coalesce into one write
+        persistence.schedule_json(CUSTOMERS_FILE, lambda: self.customers, indent=2, ensure_ascii=False)
 
     def get_names(self):
         return [c['name'] for c in self.customers]
 
     def get_customer_by_name(self, name):
-        for c in self.customers:
-            if c['name'] == name:
-                return c
-        return None
+        return self._by_name.get(name)
+
+    def _upsert(self, name, address):
+        """Add or update one customer in memory. Returns 'added', 'updated' or 'unchanged'."""
+        c = self._by_name.get(name)
+        if c is None:
+            c = {"name": name, "address": address}
+            self.customers.append(c)
+            self._by_name[name] = c
+            result = 'added'
+        elif c.get('address') != address:
+            c['address'] = address # Update address
+            result = 'updated'
+        else:
+            return 'unchanged'
+        self.revision += 1
+        self._changed_at[name] = self.revision
+        return result
 
     def add_customer(self, name, address):
         name = name.strip()
         if not name: return
         
-        # Check update
-        for c in self.customers:
-            if c['name'] == name:
-                c['address'] = address # Update address
-                self.save_customers()
-                return
-        
-        # New
-        self.customers.append({"name": name, "address": address})
-        self.save_customers()
+        if self._upsert(name, address) != 'unchanged':
+            self.save_customers()
 
-    def sync_from_history(self, orders):
-        """Populate customers from history if list is empty or to sync."""
-        count = 0
-        existing_names = set(self.get_names())
-        
-        # Process in chrono order so latest address wins? 
-        # Actually logic is: if not in DB, add it.
-        # Ideally we want the LATEST address.
-        # Orders are usually sorted desc?
-        
+    def batch_add_customers(self, customer_list, save=True):
+        """Add/update many customers and save only once. Returns an added/updated/unchanged report.
+
+        save=False leaves saving to the caller (chunked imports save once at the end).
+        """
+        report = {'added': 0, 'updated': 0, 'unchanged': 0}
+        for item in customer_list:
+            name = item['name'].strip()
+            if not name: continue
+            report[self._upsert(name, item.get('address', ''))] += 1
+
+        if save and (report['added'] or report['updated']):
+            self.save_customers()
+        debug_utils.log(
+            f"Batch customer import: {report['added']} added, "
+            f"{report['updated']} updated, {report['unchanged']} unchanged."
+        )
+        return report
+
+    def stage_customers(self, customer_list, staged):
+        """Fold parsed rows into staged ({name: address}) without touching the store.
+
+        Only rows that would add or change a customer are kept, so staged grows
+        with the changes rather than the file. Reads the store only, so imports
+        call it on their worker thread and apply the result with batch_add_customers.
+        """
+        for item in customer_list:
+            name = item['name'].strip()
+            if not name: continue
+            address = item.get('address', '')
+            c = self._by_name.get(name)
+            if c is not None and c.get('address') == address:
+                staged.pop(name, None) # A later row put it back as stored
+            else:
+                staged[name] = address
+
+    @staticmethod
+    def latest_addresses(orders):
+        """Customers seen in orders, which must come oldest first.
+
+        Returns ({name: latest address}, watermark), where watermark is the
+        [date, order_id] of the newest order seen (None if orders is empty).
+        Touches no state, so it can run on a worker thread.
+        """
+        latest = {}
+        watermark = None
         for order in orders:
-            name = order.get('customer', '').strip()
+            key = [order.get('date') or '', order.get('order_id') or '']
+            if watermark is None or key > watermark:
+                watermark = key
+
+            name = (order.get('customer') or '').strip()
             if not name: continue
-            
-            addr = order.get('address', '').strip()
-            
-            if name not in existing_names:
-                self.customers.append({"name": name, "address": addr})
-                existing_names.add(name)
-                count += 1
-            # Optional: Update address if exists but empty? 
-            # Let's keep it simple: Only add news.
-            
-        if count > 0:
+
+            addr = (order.get('address') or '').strip()
+            # A later order without an address keeps the earlier one
+            if addr or name not in latest:
+                latest[name] = addr
+        return latest, watermark
+
+    def apply_history_addresses(self, latest, since=None, fill_only=False):
+        """Add new customers and move known ones to their latest address; saves once.
+
+        An empty address never clears one on file. Customers changed after
+        revision since (e.g. by an order saved or an import run while the
+        history was being scanned) are left alone. With fill_only, known
+        customers only get an address if they have none, which is what the
+        first sync uses so it doesn't overwrite imported addresses.
+        Returns an added/updated report.
+        """
+        report = {'added': 0, 'updated': 0}
+        for name, addr in latest.items():
+            c = self._by_name.get(name)
+            if c is not None:
+                if not addr or (fill_only and c.get('address')):
+                    continue
+                if since is not None and self._changed_at.get(name, 0) > since:
+                    continue
+            result = self._upsert(name, addr)
+            if result != 'unchanged':
+                report[result] += 1
+
+        if report['added'] or report['updated']:
             self.save_customers()
-            debug_utils.log(f"Synced {count} customers from history.")
+            debug_utils.log(f"Synced customers from history: {report['added']} added, {report['updated']} updated.")
+        return report
 
-    def import_from_excel(self, filepath):
-        try:
-            import openpyxl
-            wb = openpyxl.load_workbook(filepath, data_only=True)
-            sheet = wb.active
-            
-            headers = {}
-            for cell in sheet[1]:
-                val = str(cell.value).strip().lower() if cell.value else ""
-                if val in ['客户名称', 'customer', 'name', '姓名', '客户']: headers['name'] = cell.column - 1
-                elif val in ['客户地址', 'address', '地址']: headers['address'] = cell.column - 1
-            
-            if 'name' not in headers:
-                return 0, "Excel must contain a 'Name' (客户名称) column."
-            
-            items_to_add = []
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                name = row[headers['name']]
+    def sync_from_history(self, orders, fill_only=False):
+        """Populate customers from orders (oldest first). Returns the new watermark.
+
+        Pass only the orders after the previous watermark (see
+        HistoryManager.orders_after) to avoid re-reading the whole history.
+        """
+        latest, watermark = self.latest_addresses(orders)
+        self.apply_history_addresses(latest, fill_only=fill_only)
+        return watermark
+
+    def read_excel(self, filepath, progress=None):
+        """Parse a customer sheet without touching the store.
+
+        Yields lists of {"name", "address"} dicts, a bounded chunk at a time.
+        """
+        for chunk in _read_excel_chunks(
+                filepath, CUSTOMER_COLUMNS, "Excel must contain a 'Name' (客户名称) column.", progress):
+            items = []
+            for row in chunk:
+                name = row['name']
                 if not name: continue
-                
-                addr_idx = headers.get('address')
-                addr = row[addr_idx] if addr_idx is not None and row[addr_idx] else ""
-                
-                items_to_add.append({
+
+                addr = row.get('address') or ""
+                items.append({
                     "name": str(name).strip(),
                     "address": str(addr).strip()
                 })
-            
-            # Batch add
-            added = 0
-            for item in items_to_add:
-                # Reuse add logic without constant saving? 
-                # Optimization for later. For now calls add_customer
-                self.add_customer(item['name'], item['address'])
-                added += 1
-                
-            return added, None
-            
+            yield items
+
+    def import_from_excel(self, filepath, progress=None):
+        """Import customers from an Excel file, streaming it in chunks.
+
+        Returns (rows imported, error message or None, added/updated/unchanged report).
+        """
+        report = {'added': 0, 'updated': 0, 'unchanged': 0}
+        count = 0
+        try:
+            for items_to_add in self.read_excel(filepath, progress):
+                # Bounded batches; one save at the end
+                for key, n in self.batch_add_customers(items_to_add, save=False).items():
+                    report[key] += n
+                count += len(items_to_add)
         except Exception as e:
-            return 0, str(e)
+            # Chunks before the failure are already applied (and saved below)
+            return count, str(e), report
+        finally:
+            if report['added'] or report['updated']:
+                self.save_customers()
+
+        return count, None, report
 
 class ProductManager:
     def __init__(self):
         self.products = []
+        self._index = {}     # name -> position in self.products
+        self._names = None   # cached get_product_names() result
         self.load_products()
 
     def load_products(self):
@@ -197,117 +366,172 @@ class ProductManager:
         else:
             debug_utils.log("No products file found, starting new.")
             self.products = []
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._index = {}
+        for i, p in enumerate(self.products):
+            # First occurrence wins, as with the old linear scan
+            self._index.setdefault(p['name'], i)
+        self._names = None
+
+    def _upsert(self, product_data):
+        """Replace or append one product. Returns True if it was new."""
+        i = self._index.get(product_data['name'])
+        if i is not None:
+            self.products[i] = product_data
+            return False
+        self._index[product_data['name']] = len(self.products)
+        self.products.append(product_data)
+        # Drop the cache instead of appending, callers may still hold the old list
+        self._names = None
+        return True
 
     def get_product_names(self):
-        return [p['name'] for p in self.products]
+        if self._names is None:
+            self._names = [p['name'] for p in self.products]
+        return self._names
 
     def get_product_by_name(self, name):
-        for p in self.products:
-            if p['name'] == name:
-                return p
-        return None
+        i = self._index.get(name)
+        return self.products[i] if i is not None else None
 
     def add_product(self, product_data):
-        # Check if exists
-        for i, p in enumerate(self.products):
-            if p['name'] == product_data['name']:
-                self.products[i] = product_data # Update
-                self.save_products()
-                return
-        self.products.append(product_data)
+        self._upsert(product_data)
         self.save_products()
         
-    def batch_add_products(self, product_list):
-        """Add multiple products and save only once."""
-        try:
-            updates = 0
-            adds = 0
-            for new_p in product_list:
-                found = False
-                for i, p in enumerate(self.products):
-                    if p['name'] == new_p['name']:
-                        self.products[i] = new_p
-                        found = True
-                        updates += 1
-                        break
-                if not found:
-                    self.products.append(new_p)
-                    adds += 1
-            
+    def diff_products(self, product_list):
+        """Compare incoming products with the catalog without changing it.
+
+        Returns {'added': [new], 'price_changed': [(old, new)],
+        'field_changed': [(old, new)], 'unchanged': count}. A product counts
+        as unchanged when every field it brings matches the stored one. When
+        a name repeats in product_list the last row wins, as a sequential
+        upsert would do.
+        """
+        incoming = {}
+        for p in product_list:
+            incoming[p['name']] = p
+
+        diff = {'added': [], 'price_changed': [], 'field_changed': [], 'unchanged': 0}
+        for name, new_p in incoming.items():
+            old_p = self.get_product_by_name(name)
+            if old_p is None:
+                diff['added'].append(new_p)
+                continue
+
+            change = _product_change(old_p, new_p)
+            if change:
+                diff[change].append((old_p, new_p))
+            else:
+                diff['unchanged'] += 1
+        return diff
+
+    def stage_products(self, product_list, staged):
+        """Fold parsed products into staged ({name: product}) without touching the catalog.
+
+        Only products that are new or differ from the catalog are kept (the last
+        row for a name wins). Reads the catalog only, so imports call it on
+        their worker thread and pass staged.values() to diff_products.
+        """
+        for p in product_list:
+            old_p = self.get_product_by_name(p['name'])
+            if old_p is not None and not _product_change(old_p, p):
+                staged.pop(p['name'], None) # A later row put it back as stored
+            else:
+                staged[p['name']] = p
+
+    def apply_product_diff(self, diff, save=True):
+        """Write only the added/changed records of a diff_products() result.
+
+        Saves (once) only if something changed. Returns the number of records touched.
+        """
+        touched = 0
+        for new_p in diff['added']:
+            self._upsert(new_p)
+            touched += 1
+        for _, new_p in diff['price_changed'] + diff['field_changed']:
+            self._upsert(new_p)
+            touched += 1
+
+        if save and touched:
             self.save_products()
-            debug_utils.log(f"Batch add finished: {adds} added, {updates} updated.")
-        except Exception as e:
-             debug_utils.log(f"Batch add failed: {e}")
-             raise e
+        debug_utils.log(
+            f"Product diff applied: {len(diff['added'])} added, "
+            f"{len(diff['price_changed'])} price changed, {len(diff['field_changed'])} changed, "
+            f"{diff['unchanged']} unchanged."
+        )
+        return touched
+
+    def batch_add_products(self, product_list, save=True):
+        """Add multiple products and save only once (or not at all with save=False).
+
+        Only new or changed products are written; returns how many that was.
+        """
+        return self.apply_product_diff(self.diff_products(product_list), save=save)
 
     def save_products(self):
-        try:
-            with open(PRODUCTS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.products, f, indent=2, ensure_ascii=False)
-            debug_utils.log("Products saved successfully.")
-        except Exception as e:
-            debug_utils.log(f"Error saving products to {PRODUCTS_FILE}: {e}")
-            # Re-raise so UI can handle/show error if needed, or at least we know it failed
-            raise e
+        # Written by the background writer; failures are logged there and reported by the UI
+        persistence.schedule_json(PRODUCTS_FILE, lambda: self.products, indent=2, ensure_ascii=False)
 
-    def import_from_excel(self, filepath):
-        """Import products from an Excel file."""
-        try:
-            import openpyxl
-        except ImportError:
-            raise ImportError("openpyxl module is required for Excel import. Please install it.")
+    def read_excel(self, filepath, progress=None):
+        """Parse a product sheet without touching the store.
 
-        try:
-            wb = openpyxl.load_workbook(filepath, data_only=True)
-            sheet = wb.active
-            
-            # Identify columns
-            headers = {}
-            for cell in sheet[1]: # First row
-                val = str(cell.value).strip().lower() if cell.value else ""
-                if val in ['商品名称', 'name', '品名']: headers['name'] = cell.column - 1
-                elif val in ['规格型号', 'model', '型号']: headers['model'] = cell.column - 1
-                elif val in ['适用机型', 'machine', 'machine_model', '机型']: headers['machine_model'] = cell.column - 1
-                elif val in ['单位', 'unit']: headers['unit'] = cell.column - 1
-                elif val in ['参考单价', '单价', 'price']: headers['price'] = cell.column - 1
-            
-            if 'name' not in headers:
-                return 0, "Excel must contain a 'Name' or '商品名称' column."
-
-            items_to_add = []
-            
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                name = row[headers['name']]
+        Yields lists of product dicts, a bounded chunk at a time.
+        """
+        for chunk in _read_excel_chunks(
+                filepath, PRODUCT_COLUMNS, "Excel must contain a 'Name' or '商品名称' column.", progress):
+            items = []
+            for row in chunk:
+                name = row['name']
                 if not name: continue # Skip empty names
-                
+
                 # Get other values safely
-                model = row[headers['model']] if 'model' in headers else ""
-                machine = row[headers['machine_model']] if 'machine_model' in headers else ""
-                unit = row[headers['unit']] if 'unit' in headers else ""
-                price_val = row[headers['price']] if 'price' in headers else 0
-                
+                model = row.get('model') or ""
+                machine = row.get('machine_model') or ""
+                unit = row.get('unit') or ""
+                price_val = row.get('price') or 0
+
                 try:
                     price = float(price_val) if price_val else 0.0
                 except:
                     price = 0.0
-                
-                product_data = {
+
+                items.append({
                     "name": str(name).strip(),
                     "model": str(model).strip() if model else "",
                     "machine_model": str(machine).strip() if machine else "",
                     "unit": str(unit).strip() if unit else "",
                     "price": price
-                }
-                
-                items_to_add.append(product_data)
-
-            if items_to_add:
-                self.batch_add_products(items_to_add)
-                
-            return len(items_to_add), None
-            
+                })
+            yield items
+
+    def import_from_excel(self, filepath, progress=None):
+        """Import products from an Excel file, streaming it in chunks.
+
+        progress(rows_read, total) is called as chunks are read. Like the
+        import dialog, rows are staged first and diffed once, so a file that
+        changes nothing (even with a name repeated across chunks) is not saved.
+        """
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportError("openpyxl module is required for Excel import. Please install it.")
+
+        count = 0
+        staged = {}
+        error = None
+        try:
+            for items_to_add in self.read_excel(filepath, progress):
+                self.stage_products(items_to_add, staged)
+                count += len(items_to_add)
         except Exception as e:
-            return 0, str(e)
+            # Rows read before the failure are still applied below
+            error = str(e)
+
+        # Saves once, and only if something changed
+        self.apply_product_diff(self.diff_products(staged.values()))
+        return count, error
 
 
 class OrderNumberGenerator:
@@ -329,12 +553,7 @@ class OrderNumberGenerator:
             self.config = {"last_date": "", "sequence": 0}
 
     def save_config(self):
-        try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2)
-            debug_utils.log("Config saved successfully.")
-        except Exception as e:
-            debug_utils.log(f"Error saving config: {e}")
+        persistence.schedule_json(CONFIG_FILE, lambda: self.config, indent=2)
 
     def get_last_save_path(self):
         return self.config.get("last_save_path", "")
@@ -353,6 +572,14 @@ class OrderNumberGenerator:
             self.config["last_date"] = today_str
             self.config["sequence"] = 1
         
+        # Written now rather than behind: a crash before the write would hand out
+        # this number again. Still scheduled too, so a background write of an
+        # older snapshot that finishes after this one is overwritten again.
+        try:
+            persistence.atomic_write_json(CONFIG_FILE, self.config, indent=2)
+        except Exception as e:
+            debug_utils.log(f"Error saving order number: {e}")
+            persistence.report_error(CONFIG_FILE, str(e))
         self.save_config()
         
         seq_str = f"{self.config['sequence']:03d}"
@@ -53,5 +53,12 @@ def main():
 
     root.mainloop()
 
+    # Make sure pending background saves reach disk before exiting
+    import persistence
+    persistence.flush()
+
 if __name__ == "__main__":
+    # Needed for the batch export worker processes in frozen (PyInstaller) builds
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import debug_utils
+
+# Rendered PDFs kept on disk; least recently used files go first past this size
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+
+def _default_dir():
+    from logic import BASE_DIR
+    return os.path.join(BASE_DIR, 'pdf_cache')
+
+
+def cache_key(order, report_type='delivery', seller_info=None, fonts=None):
+    """sha256 over everything that decides what the PDF looks like."""
+    from export_pdf import DEFAULT_SELLER, LAYOUT_VERSION
+    seller_name = seller_info.get('name', DEFAULT_SELLER) if seller_info else DEFAULT_SELLER
+    payload = {
+        # Drop UI-only keys such as '_checked'
+        'order': {k: v for k, v in order.items() if not k.startswith('_')},
+        'seller': seller_name,
+        'report_type': report_type,
+        'layout': LAYOUT_VERSION,
+        'fonts': list(fonts) if fonts else None,
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    """Disk cache of rendered PDFs, one <key>.pdf per entry.
+
+    Safe to share between processes: entries are written to a temp file and
+    renamed into place, and a hit touches the file's mtime so eviction can
+    drop the least recently used ones.
+    """
+
+    def __init__(self, directory=None, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory or _default_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None   # running estimate; rescanned before evicting
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pdf')
+
+    def get(self, key, dest):
+        """Copy the cached PDF for key to dest. Returns False on a miss."""
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, dest)
+        except FileNotFoundError:
+            return False
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def get_bytes(self, key):
+        """The cached PDF for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, src):
+        """Store a copy of the PDF at src under key."""
+        self._store(key, lambda tmp_path: shutil.copyfile(src, tmp_path))
+
+    def put_bytes(self, key, data):
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        self._store(key, write)
+
+    def _store(self, key, write):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue   # removed by another process
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Other processes share the directory, so trust a fresh scan over the estimate
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.8   # leave headroom so every put doesn't evict
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._size = total
+        if removed:
+            debug_utils.log(f"PDF cache: evicted {removed} files, {total // 1024} KB left")
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+        with self._lock:
+            self._size = 0
+
+
+_default_cache = None
+
+
+def get_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PDFCache()
+    return _default_cache
+
+
+def export_pdf_cached(order, filepath, report_type='delivery', seller_info=None, cache=None):
+    """export_pdf, but an order rendered before is copied from the cache.
+
+    Returns True on a cache hit. A cache that cannot be read or written only
+    costs the render; it never fails the export.
+    """
+    from export_pdf import export_pdf, register_fonts
+    cache = cache or get_cache()
+    key = cache_key(order, report_type, seller_info, register_fonts())
+
+    try:
+        if cache.get(key, filepath):
+            return True
+    except OSError as e:
+        debug_utils.log(f"PDF cache read failed: {e}")
+
+    export_pdf(order, filepath, report_type=report_type, seller_info=seller_info)
+
+    try:
+        cache.put(key, filepath)
+    except OSError as e:
+        debug_utils.log(f"PDF cache write failed: {e}")
+    return False
+
+
+def render_pdf_cached(order, report_type='delivery', seller_info=None, cache=None):
+    """PDF bytes for order, from the cache when possible (see export_pdf_cached)."""
+    from export_pdf import export_pdf, register_fonts
+    cache = cache or get_cache()
+    key = cache_key(order, report_type, seller_info, register_fonts())
+
+    try:
+        data = cache.get_bytes(key)
+        if data is not None:
+            return data
+    except OSError as e:
+        debug_utils.log(f"PDF cache read failed: {e}")
+
+    data = export_pdf(order, report_type=report_type, seller_info=seller_info)
+
+    try:
+        cache.put_bytes(key, data)
+    except OSError as e:
+        debug_utils.log(f"PDF cache write failed: {e}")
+    return data
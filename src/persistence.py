@@ -0,0 +1,163 @@
+import atexit
+import json
+import os
+import queue
+import threading
+
+import debug_utils
+
+# Changes arriving within this window are written out together
+COALESCE_DELAY = 0.2
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """Write JSON to a temp file, then swap it in so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data if isinstance(data, str) else json.dumps(data, **dump_kwargs))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class WriteBehindWriter:
+    """One background thread that performs store writes off the UI thread.
+
+    Stores call schedule() with a key (usually the file path) and a write
+    function. Scheduling the same key again before it runs just replaces the
+    pending job, so a burst of changes costs one write per store.
+    """
+
+    def __init__(self, delay=COALESCE_DELAY):
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._pending = {}   # key -> write function, in scheduling order
+        self._busy = False
+        self._flushing = False
+        self._thread = None
+        self.errors = queue.Queue()   # (key, message) per failed write; see take_errors
+        self._failed = {}             # key -> write function whose last run failed
+
+    def schedule(self, key, write_fn):
+        with self._cond:
+            self._pending[key] = write_fn
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                # Let the burst settle, unless someone is waiting in flush()
+                self._cond.wait_for(lambda: self._flushing, timeout=self.delay)
+                jobs = list(self._pending.items())
+                self._pending.clear()
+                self._busy = True
+
+            for key, write_fn in jobs:
+                self._run_job(key, write_fn)
+
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _run_job(self, key, write_fn):
+        try:
+            write_fn()
+        except Exception as e:
+            debug_utils.log(f"Write of {key} failed: {e}")
+            self.errors.put((key, str(e)))
+            with self._cond:
+                self._failed[key] = write_fn
+        else:
+            with self._cond:
+                self._failed.pop(key, None)
+
+    def retry_failed(self):
+        """Schedule every write whose last attempt failed again."""
+        with self._cond:
+            # A key that is queued again already has a newer write on the way
+            failed = [(k, fn) for k, fn in self._failed.items() if k not in self._pending]
+            self._failed.clear()
+        for key, write_fn in failed:
+            self.schedule(key, write_fn)
+
+    def flush(self, timeout=None):
+        """Block until everything scheduled so far is on disk. Returns False on timeout.
+
+        Writes that failed earlier are tried once more.
+        """
+        self.retry_failed()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                # Nothing to wait for (or the thread is gone at shutdown): write inline
+                jobs = list(self._pending.items())
+                self._pending.clear()
+            else:
+                self._flushing = True
+                self._cond.notify_all()
+                done = self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+                self._flushing = False
+                return done
+
+        for key, write_fn in jobs:
+            self._run_job(key, write_fn)
+        return True
+
+
+writer = WriteBehindWriter()
+
+
+def schedule(key, write_fn):
+    writer.schedule(key, write_fn)
+
+
+def schedule_json(path, producer, **dump_kwargs):
+    """Mark a JSON store dirty. producer() is called on the writer thread to get the data."""
+    def write():
+        # The UI thread may be mutating the data while we serialize it;
+        # try again on a fresh snapshot instead of writing a torn one.
+        for attempt in range(3):
+            try:
+                text = json.dumps(producer(), **dump_kwargs)
+                break
+            except RuntimeError:
+                if attempt == 2:
+                    raise
+        atomic_write_json(path, text)
+        debug_utils.log(f"Saved {os.path.basename(path)}")
+
+    writer.schedule(path, write)
+
+
+def flush(timeout=None):
+    return writer.flush(timeout)
+
+
+def retry_failed():
+    writer.retry_failed()
+
+
+def report_error(key, message):
+    """Queue a failed write made outside the writer (see take_errors)."""
+    writer.errors.put((key, message))
+
+
+def take_errors():
+    """(key, message) for each write that failed since the last call.
+
+    Failures happen on the writer thread; the UI polls this to report them.
+    """
+    errors = []
+    while True:
+        try:
+            errors.append(writer.errors.get_nowait())
+        except queue.Empty:
+            return errors
+
+
+atexit.register(flush)
@@ -1,14 +1,51 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk
 import datetime
 import os
 from logic import ProductManager, OrderNumberGenerator, CustomerManager
-from history import HistoryManager
-from export_pdf import export_pdf
-from export_excel import export_to_excel
+from history import create_history_manager
+from pdf_cache import export_pdf_cached
+# reportlab (export_pdf), openpyxl (export_excel), PIL and the process pool
+# (batch_export) are imported where they are used; prewarm_imports loads
+# them in the background once the window is up.
 import sys
+import threading
+import queue
 import debug_utils
+import persistence
+
+
+# Give the window time to appear before the background imports compete for the GIL
+PREWARM_DELAY_MS = 300
+
+# How often failed background saves are checked for and reported
+WRITE_ERROR_POLL_MS = 1000
+
+
+def prewarm_imports(font_hint=None, on_font=None):
+    """Import the export/import libraries and register the PDF font on a
+    background thread, so the first export or import doesn't wait for them.
+
+    on_font(choice) is called on that thread once the font is registered,
+    with the (path, name, sub_index) from export_pdf.get_font_choice().
+    """
+    def run():
+        try:
+            import export_pdf
+            export_pdf.register_fonts(font_hint)
+            if on_font:
+                on_font(export_pdf.get_font_choice())
+            import export_excel
+            import batch_export
+            from PIL import Image, ImageTk
+        except Exception as e:
+            # Nothing is lost: each use site imports what it needs again
+            debug_utils.log(f"Pre-warming imports failed: {e}")
+
+    t = threading.Thread(target=run, name="import-prewarm", daemon=True)
+    t.start()
+    return t
+
 
 class DeliveryApp:
     def __init__(self, root):
@@ -16,18 +53,22 @@ class DeliveryApp:
         self.root = root
         self.product_manager = ProductManager()
         self.order_generator = OrderNumberGenerator()
-        self.history_manager = HistoryManager()
         self.customer_manager = CustomerManager()
-        
-        # Sync customers from history (Backward Compatibility)
-        try:
-            self.customer_manager.sync_from_history(self.history_manager.orders)
-        except Exception as e:
-            debug_utils.log(f"Sync customers failed: {e}")
+
+        # Order history can be large: read it on a worker thread while the
+        # window comes up (see history_manager / _on_history_loaded)
+        self._history_manager = None
+        self._history_error = None
+        self._customer_sync = None   # customer addresses scanned on the loader thread
+        self._history_thread = threading.Thread(target=self._load_history_manager, name="history-load", daemon=True)
+        self._history_thread.start()
         debug_utils.log("Managers initialized")
         
         self.current_items = []
-        self.history_displayed_items = [] # For history tab checkboxes
+        self._main_iids = []   # main tree iid per current_items index (see refresh_tree)
+        self._main_index = {}  # and back
+        self.history_displayed_items = [] # Orders shown in the history tab (references, not copies)
+        self.history_selected = set()     # order_ids checked in the history tab; survives re-filtering
         
         self.search_timer = None # For debounce
         
@@ -35,6 +76,107 @@ class DeliveryApp:
         debug_utils.log("Menu setup done")
         self.setup_ui()
         debug_utils.log("UI setup done")
+        self._poll_history_loaded()
+        self._poll_write_errors()
+
+        # Once the window is showing, load the export libraries and parse the
+        # Chinese font in the background instead of on first export
+        self.root.after(PREWARM_DELAY_MS, lambda: prewarm_imports(
+            self.order_generator.config.get("pdf_font"), self._remember_font_choice
+        ))
+
+    def _load_history_manager(self):
+        # Worker thread: nothing here may touch Tk
+        try:
+            self._history_manager = create_history_manager(
+                self.order_generator.config.get("history_storage", "journal")
+            )
+        except Exception as e:
+            debug_utils.log(f"Loading history failed: {e}")
+            self._history_error = e
+            return
+
+        # Only orders saved after the last customer sync need scanning
+        try:
+            revision = self.customer_manager.revision # changes after this win over the scan
+            watermark = self.order_generator.config.get("customer_sync_watermark")
+            new_orders = self._history_manager.orders_after(watermark)
+            latest, new_watermark = CustomerManager.latest_addresses(new_orders)
+            self._customer_sync = {
+                'addresses': latest,
+                'watermark': new_watermark,
+                'revision': revision,
+                # First sync reads the whole history: don't overwrite addresses already on file
+                'fill_only': watermark is None,
+            }
+            debug_utils.log(f"Customer sync: {len(new_orders)} orders after {watermark}")
+        except Exception as e:
+            debug_utils.log(f"Scanning history for customers failed: {e}")
+
+    @property
+    def history_manager(self):
+        """The history store. Waits for the startup load if it is still running."""
+        if self._history_manager is None:
+            self._history_thread.join()
+            if self._history_manager is None:
+                raise RuntimeError(f"历史记录加载失败 / Could not load order history: {self._history_error}")
+        return self._history_manager
+
+    def _poll_history_loaded(self):
+        if self._history_thread.is_alive():
+            self.root.after(50, self._poll_history_loaded)
+            return
+        self._on_history_loaded()
+
+    def _poll_write_errors(self):
+        # Stores are saved on the write-behind thread; report its failures here
+        errors = persistence.take_errors()
+        if errors:
+            lines = "\n".join(f"{os.path.basename(str(key))}: {msg}" for key, msg in errors[:5])
+            messagebox.showerror("Error", f"保存失败，数据可能未写入磁盘 / Could not save:\n{lines}")
+            # Try again once the user has seen it (e.g. after reconnecting a network drive)
+            persistence.retry_failed()
+        self.root.after(WRITE_ERROR_POLL_MS, self._poll_write_errors)
+
+    def _on_history_loaded(self):
+        """Tk thread, once the history is in memory: fill whatever was waiting for it."""
+        if self._history_manager is None:
+            messagebox.showerror("Error", f"历史记录加载失败 / Could not load order history: {self._history_error}")
+            return
+
+        # Sync customers from history (Backward Compatibility)
+        try:
+            sync = self._customer_sync
+            if sync is not None:
+                self._customer_sync = None
+                self.customer_manager.apply_history_addresses(
+                    sync['addresses'], since=sync['revision'], fill_only=sync['fill_only']
+                )
+                if sync['watermark'] is not None:
+                    self.order_generator.config["customer_sync_watermark"] = sync['watermark']
+                    self.order_generator.save_config()
+            self.all_customers = self.customer_manager.get_names()
+            self.entry_customer['values'] = self.all_customers
+        except Exception as e:
+            debug_utils.log(f"Sync customers failed: {e}")
+
+        if 'history' in self._built_tabs:
+            self.load_history()
+        if 'summary' in self._built_tabs:
+            self.all_customers_summary = self._history_manager.get_unique_customers()
+            self.cb_summary_customer['values'] = self.all_customers_summary
+        debug_utils.log("History loaded")
+
+    def _on_tab_changed(self, event=None):
+        # History and Summary are built the first time they are shown
+        current = self.notebook.select()
+        if current == str(self.tab_history) and 'history' not in self._built_tabs:
+            self._built_tabs.add('history')
+            self.setup_history_tab()
+            self.load_history() # shows a placeholder until the history is loaded
+        elif current == str(self.tab_summary) and 'summary' not in self._built_tabs:
+            self._built_tabs.add('summary')
+            self.setup_summary_tab()
 
     # ... (setup_menu, show_about, import_products, setup_ui, setup_generate_tab, setup_history_tab, update_order_id_display, on_product_select ...)
 
@@ -121,6 +263,7 @@ class DeliveryApp:
             
         try:
             if os.path.exists(img_full_path):
+                from PIL import Image, ImageTk
                 img = Image.open(img_full_path)
                 img = img.resize((200, 200), Image.Resampling.LANCZOS)
                 photo = ImageTk.PhotoImage(img)
@@ -164,17 +307,22 @@ class DeliveryApp:
         )
         if not filepath: return
 
-        try:
-            count, error = self.customer_manager.import_from_excel(filepath)
-            if error:
-                 messagebox.showerror("Import Failed", error)
-            else:
-                 messagebox.showinfo("Success", f"成功导入 {count} 个客户！")
-                 # Refresh dropdown
-                 self.all_customers = self.customer_manager.get_names()
-                 self.entry_customer['values'] = self.all_customers
-        except Exception as e:
-             messagebox.showerror("Error", str(e))
+        def apply(staged, rows):
+            report = self.customer_manager.batch_add_customers(
+                [{'name': name, 'address': address} for name, address in staged.items()]
+            )
+            # Rows left out while staging already matched the store
+            unchanged = rows - report['added'] - report['updated']
+            # Refresh dropdown
+            self.all_customers = self.customer_manager.get_names()
+            self.entry_customer['values'] = self.all_customers
+            messagebox.showinfo("Success", (
+                f"成功导入 {rows} 个客户！\n"
+                f"新增 {report['added']}，更新 {report['updated']}，未变 {unchanged}"
+            ))
+
+        self._run_import("导入客户 / Importing Customers", self.customer_manager.read_excel, filepath,
+                         self.customer_manager.stage_customers, apply)
 
     def import_products(self):
         debug_utils.log("User clicked Import Products")
@@ -206,20 +354,100 @@ class DeliveryApp:
             return
         
         debug_utils.log(f"Selected file: {filepath}")
-        try:
-            count, error = self.product_manager.import_from_excel(filepath)
-            if error:
-                debug_utils.log(f"Import Error: {error}")
-                messagebox.showerror("Import Failed", f"Error: {error}")
-            else:
-                debug_utils.log(f"Import Success: {count}")
-                messagebox.showinfo("Success", f"成功导入 {count} 个产品！\nSuccessfully imported {count} items.")
-                # Refresh combobox
-                self.all_product_names = self.product_manager.get_product_names()
-                self.cb_product['values'] = self.all_product_names
-        except Exception as e:
-             debug_utils.log(f"Import crashed: {e}")
-             messagebox.showerror("Error", f"Import crashed: {e}")
+
+        def apply(staged, rows):
+            # Compare with the catalog first; only added/changed products are written
+            diff = self.product_manager.diff_products(staged.values())
+            # Rows left out while staging already matched the catalog
+            diff['unchanged'] += rows - len(staged)
+            changes = len(diff['added']) + len(diff['price_changed']) + len(diff['field_changed'])
+            if not changes:
+                messagebox.showinfo("Import", f"没有变化，未写入 / No changes ({diff['unchanged']} unchanged)")
+                return
+
+            dialog = ImportDiffDialog(self.root, diff)
+            self.root.wait_window(dialog)
+            if not dialog.confirmed:
+                return
+
+            self.product_manager.apply_product_diff(diff)
+            debug_utils.log(f"Import Success: {changes} changed")
+            # Refresh combobox
+            self.all_product_names = self.product_manager.get_product_names()
+            self.cb_product['values'] = self.all_product_names
+            messagebox.showinfo("Success", (
+                f"成功导入！新增 {len(diff['added'])}，调价 {len(diff['price_changed'])}，"
+                f"修改 {len(diff['field_changed'])}，未变 {diff['unchanged']}\n"
+                f"Successfully imported {changes} changed items."
+            ))
+
+        self._run_import("导入产品 / Importing Products", self.product_manager.read_excel, filepath,
+                         self.product_manager.stage_products, apply)
+
+    def _run_import(self, title, read_excel, filepath, stage, apply):
+        """Parse filepath on a worker thread behind a modal progress dialog.
+
+        read_excel(filepath, progress) yields chunks of parsed rows and
+        stage(chunk, staged) folds each into a dict of pending changes, both on
+        the worker; rows that change nothing are dropped there, so memory
+        follows the number of changes, not the file size. apply(staged, rows)
+        runs on the Tk thread once parsing is done and only writes the
+        changes, so cancelling leaves the stores exactly as they were.
+        """
+        events = queue.Queue()
+        cancel = threading.Event()
+
+        def work():
+            staged = {}
+            rows = 0
+            chunks = read_excel(filepath, lambda done, total: events.put(('progress', done, total)))
+            try:
+                for chunk in chunks:
+                    if cancel.is_set():
+                        events.put(('cancelled',))
+                        return
+                    stage(chunk, staged)
+                    rows += len(chunk)
+                events.put(('done', staged, rows))
+            except Exception as e:
+                events.put(('error', str(e)))
+            finally:
+                chunks.close() # closes the workbook if we stopped early
+
+        threading.Thread(target=work, name="excel-import", daemon=True).start()
+        dialog = ProgressDialog(self.root, title, None, on_cancel=cancel.set)
+
+        def poll():
+            while True:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    self.root.after(100, poll)
+                    return
+
+                kind = event[0]
+                if kind == 'progress':
+                    done, total = event[1], event[2]
+                    # Files without a size record only tell us how far we got
+                    text = None if total else f"已读取 {done} 行 / {done} rows read"
+                    dialog.update_progress(done, total, text=text)
+                    continue
+
+                dialog.destroy()
+                if kind == 'error':
+                    debug_utils.log(f"Import Error: {event[1]}")
+                    messagebox.showerror("Import Failed", f"Error: {event[1]}")
+                elif kind == 'cancelled' or cancel.is_set():
+                    messagebox.showinfo("Import", "已取消导入，数据未改动 / Import cancelled, nothing was changed")
+                else:
+                    try:
+                        apply(event[1], event[2])
+                    except Exception as e:
+                        debug_utils.log(f"Import crashed: {e}")
+                        messagebox.showerror("Error", f"Import crashed: {e}")
+                return
+
+        poll()
 
     def setup_ui(self):
         # Notebook for Tabs
@@ -255,15 +483,16 @@ class DeliveryApp:
         self.notebook.add(self.tab_generate, text='  开单 (Create Order)  ')
         self.setup_generate_tab()
 
-        # Tab 2: History
+        # Tab 2: History (contents built on first view, see _on_tab_changed)
         self.tab_history = ttk.Frame(self.notebook)
         self.notebook.add(self.tab_history, text='  历史记录 (History)  ')
-        self.setup_history_tab()
 
         # Tab 3: Order Summary (New)
         self.tab_summary = ttk.Frame(self.notebook)
         self.notebook.add(self.tab_summary, text='  订单汇总 (Summary)  ')
-        self.setup_summary_tab()
+
+        self._built_tabs = set()
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
 
     def setup_generate_tab(self):
         # Top Frame 0: Seller Info (New)
@@ -409,7 +638,8 @@ class DeliveryApp:
         
         ttk.Label(filter_frame, text="客户名称:").pack(side='left', padx=5)
         # Unique customers for dropdown
-        self.all_customers_history = self.history_manager.get_unique_customers()
+        # Filled by load_history once the history is loaded
+        self.all_customers_history = []
         self.h_customer = ttk.Combobox(filter_frame, values=self.all_customers_history, width=15)
         self.h_customer.pack(side='left', padx=5)
 
@@ -429,6 +659,8 @@ class DeliveryApp:
 
         ttk.Button(filter_frame, text="查询 / Search", command=self.load_history).pack(side='left', padx=10)
         ttk.Button(filter_frame, text="导出汇总 / Export Summary", command=self.export_history_summary).pack(side='right', padx=10)
+        self.var_summary_by_month = tk.IntVar()
+        ttk.Checkbutton(filter_frame, text="按月分表 / By Month", variable=self.var_summary_by_month).pack(side='right')
 
         # History Tree
         h_frame = ttk.Frame(self.tab_history)
@@ -436,7 +668,10 @@ class DeliveryApp:
         
         # Add Checkbox column
         cols = ("勾选", "单据编号", "日期", "客户名称", "总金额", "制单人")
-        self.h_tree = ttk.Treeview(h_frame, columns=cols, show='headings')
+        # Only the visible rows exist in the Treeview; they are refilled on scroll
+        self.h_grid = VirtualTree(h_frame, cols, self._history_row_values)
+        self.h_grid.pack(fill='both', expand=True)
+        self.h_tree = self.h_grid.tree
         
         self.h_tree.heading("勾选", text="√")
         self.h_tree.column("勾选", width=40, anchor='center')
@@ -444,12 +679,6 @@ class DeliveryApp:
         for col in cols[1:]:
             self.h_tree.heading(col, text=col)
             self.h_tree.column(col, anchor='center')
-            
-        scrollbar = ttk.Scrollbar(h_frame, orient="vertical", command=self.h_tree.yview)
-        self.h_tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.h_tree.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
         
         # Bind click for checkboxes
         self.h_tree.bind("<Button-1>", self.on_history_click)
@@ -464,6 +693,8 @@ class DeliveryApp:
         ttk.Button(action_frame, text="删除选中记录 / Delete Selected", command=self.delete_selected_history).pack(side='left', padx=10)
         
         ttk.Button(action_frame, text="导出选中单据 / Export PDF", command=self.export_selected_pdfs).pack(side='right', padx=10)
+        ttk.Button(action_frame, text="合并导出 / Combined PDF", command=self.export_selected_combined).pack(side='right', padx=10)
+        ttk.Button(action_frame, text="打包导出 / Export ZIP", command=self.export_selected_zip).pack(side='right', padx=10)
 
 
     def update_order_id_display(self):
@@ -630,6 +861,9 @@ class DeliveryApp:
         self.current_items.append(item)
         self.refresh_tree()
         
+        # Save Product (in memory now, written to disk by the background writer)
+        self.product_manager.add_product(product_data)
+
         # Refresh combobox
         self.all_product_names = self.product_manager.get_product_names()
         self.cb_product['values'] = self.all_product_names
@@ -639,19 +873,7 @@ class DeliveryApp:
         self.entry_model.delete(0, tk.END)
         self.entry_machine.delete(0, tk.END)
         
-        # Async Save
-        import threading
-        def save_task():
-            try:
-                # This saves to disk
-                self.product_manager.add_product(product_data)
-                debug_utils.log("Async save complete.")
-            except Exception as e:
-                debug_utils.log(f"Async save failed: {e}")
-        
-        threading.Thread(target=save_task, daemon=True).start()
-        
-        debug_utils.log("UI updated, save task started.")
+        debug_utils.log("UI updated, product save scheduled.")
 
     def on_tree_double_click(self, event):
         # Identify region
@@ -682,10 +904,8 @@ class DeliveryApp:
         if not item_id: return
         
         # Get index in current_items list
-        all_ids = self.tree.get_children()
-        try:
-            list_idx = all_ids.index(item_id)
-        except ValueError:
+        list_idx = self._main_index.get(item_id)
+        if list_idx is None:
             return
             
         self.edit_cell(item_id, list_idx, target['key'], target['col_name'], target['type'])
@@ -728,7 +948,8 @@ class DeliveryApp:
                     updated_item = self.current_items[list_idx]
                     updated_item['total'] = updated_item['qty'] * updated_item['price']
                     
-                self.refresh_tree()
+                self.tree.item(item_id, values=self._main_row_values(list_idx))
+                self.update_total_label()
                 entry.destroy()
             except ValueError:
                 messagebox.showerror("Error", "Invalid Value")
@@ -747,26 +968,36 @@ class DeliveryApp:
         for i in self.tree.get_children():
             self.tree.delete(i)
         
-        total_amt = 0.0
+        # iid <-> current_items index, so clicks and edits can update one row
+        self._main_iids = []
+        self._main_index = {}
         for idx, item in enumerate(self.current_items):
             # Ensure _checked key exists (migration for old items if any)
             if '_checked' not in item: item['_checked'] = False
             
-            check_mark = "☑" if item['_checked'] else "☐"
-            
-            self.tree.insert("", "end", values=(
-                check_mark,
-                idx + 1,
-                item['name'],
-                item['model'],
-                item['unit'],
-                item['qty'],
-                f"{item['price']:.2f}",
-                f"{item['total']:.2f}",
-                item['remark']
-            ))
-            total_amt += item['total']
+            iid = self.tree.insert("", "end", values=self._main_row_values(idx))
+            self._main_iids.append(iid)
+            self._main_index[iid] = idx
             
+        self.update_total_label()
+
+    def _main_row_values(self, idx):
+        item = self.current_items[idx]
+        check_mark = "☑" if item['_checked'] else "☐"
+        return (
+            check_mark,
+            idx + 1,
+            item['name'],
+            item['model'],
+            item['unit'],
+            item['qty'],
+            f"{item['price']:.2f}",
+            f"{item['total']:.2f}",
+            item['remark']
+        )
+
+    def update_total_label(self):
+        total_amt = sum(item['total'] for item in self.current_items)
         self.lbl_total.config(text=f"总金额: {total_amt:.2f}")
 
     def on_main_tree_click(self, event):
@@ -779,21 +1010,20 @@ class DeliveryApp:
             if not item_id: return
             
             # Find index
-            all_ids = self.tree.get_children()
-            try:
-                list_idx = all_ids.index(item_id)
-            except ValueError:
+            list_idx = self._main_index.get(item_id)
+            if list_idx is None:
                 return
             
-            # Toggle
+            # Toggle, redrawing just this row
             self.current_items[list_idx]['_checked'] = not self.current_items[list_idx]['_checked']
-            self.refresh_tree()
+            self.tree.set(item_id, "勾选", "☑" if self.current_items[list_idx]['_checked'] else "☐")
 
     def toggle_select_all_main(self):
         is_checked = self.var_select_all_main.get()
-        for item in self.current_items:
+        mark = "☑" if is_checked else "☐"
+        for item, iid in zip(self.current_items, self._main_iids):
             item['_checked'] = bool(is_checked)
-        self.refresh_tree()
+            self.tree.set(iid, "勾选", mark)
 
     def delete_item(self):
         # 1. Check for checked boxes
@@ -804,10 +1034,9 @@ class DeliveryApp:
             selected = self.tree.selection()
             if selected:
                 # Find indices from tree items
-                all_ids = self.tree.get_children()
                 for sel_id in selected:
-                    if sel_id in all_ids:
-                        to_delete_indices.append(all_ids.index(sel_id))
+                    if sel_id in self._main_index:
+                        to_delete_indices.append(self._main_index[sel_id])
         
         if not to_delete_indices:
              return
@@ -849,7 +1078,8 @@ class DeliveryApp:
             "customer": customer,
             "address": self.entry_address.get(),
             "maker": self.entry_maker.get(),
-            "items": self.current_items,
+            # Copy so later edits in the item list don't alter the saved order
+            "items": [dict(i) for i in self.current_items],
             "total": sum(x['total'] for x in self.current_items)
         }
         
@@ -879,7 +1109,8 @@ class DeliveryApp:
                 seller_name = self.entry_seller_name.get()
                 self._save_seller_info(seller_name)
                 
-                export_pdf(order_data, filepath, seller_info={'name': seller_name})
+                # Goes through the cache so a later re-export from history is a copy
+                export_pdf_cached(order_data, filepath, seller_info={'name': seller_name})
                 # Save the directory for next time
                 self.order_generator.set_last_save_path(filepath)
                 
@@ -893,9 +1124,12 @@ class DeliveryApp:
                 messagebox.showerror("Error", f"Export failed: {e}")
 
     def load_history(self):
-        for i in self.h_tree.get_children():
-            self.h_tree.delete(i)
-            
+        if 'history' not in self._built_tabs:
+            return # Built (and loaded) when the tab is first opened
+        if self._history_manager is None:
+            self.h_grid.set_placeholder("正在加载… / Loading…")
+            return # _on_history_loaded calls us again
+
         start = self.h_start_date.get()
         end = self.h_end_date.get()
         kw = self.h_keyword.get()
@@ -907,31 +1141,26 @@ class DeliveryApp:
         
         orders = self.history_manager.get_orders(start, end, kw, customer)
         
-        # Store for checkbox state management
-        self.history_displayed_items = []
-        for o in orders:
-            # Shallow copy to add temporary UI state
-            o_ui = o.copy()
-            o_ui['_checked'] = False
-            self.history_displayed_items.append(o_ui)
+        # Checkbox state lives in history_selected, so the orders are shown as they are
+        self.history_displayed_items = orders
             
         self.refresh_history_tree()
         
     def refresh_history_tree(self):
-        for i in self.h_tree.get_children():
-            self.h_tree.delete(i)
-            
-        for idx, o in enumerate(self.history_displayed_items):
-            check_mark = "☑" if o.get('_checked') else "☐"
-            
-            self.h_tree.insert("", "end", values=(
-                check_mark,
-                o.get('order_id'),
-                o.get('date'),
-                o.get('customer'),
-                f"{o.get('total', 0):.2f}",
-                o.get('maker')
-            ))
+        # Cheap at any history size: only the visible rows are redrawn
+        self.h_grid.set_count(len(self.history_displayed_items))
+
+    def _history_row_values(self, idx):
+        o = self.history_displayed_items[idx]
+        check_mark = "☑" if o.get('order_id') in self.history_selected else "☐"
+        return (
+            check_mark,
+            o.get('order_id'),
+            o.get('date'),
+            o.get('customer'),
+            f"{o.get('total', 0):.2f}",
+            o.get('maker')
+        )
             
     def on_history_click(self, event):
         region = self.h_tree.identify("region", event.x, event.y)
@@ -943,30 +1172,65 @@ class DeliveryApp:
             if not item_id: return
             
             # Find index
-            all_ids = self.h_tree.get_children()
-            try:
-                list_idx = all_ids.index(item_id)
-            except ValueError:
+            list_idx = self.h_grid.index_of(item_id)
+            if list_idx is None:
                 return
             
-            # Toggle
-            self.history_displayed_items[list_idx]['_checked'] = not self.history_displayed_items[list_idx]['_checked']
-            self.refresh_history_tree()
+            # Toggle; only this row is redrawn and the scroll position stays
+            order_id = self.history_displayed_items[list_idx].get('order_id')
+            if order_id in self.history_selected:
+                self.history_selected.discard(order_id)
+            else:
+                self.history_selected.add(order_id)
+            # Orders sharing an ID share a checkbox; redraw those on screen too
+            for idx in self.h_grid.visible_indices():
+                if self.history_displayed_items[idx].get('order_id') == order_id:
+                    self.h_grid.refresh_index(idx)
 
     def toggle_select_all_history(self):
-        is_checked = self.var_select_all_history.get()
-        for item in self.history_displayed_items:
-            item['_checked'] = bool(is_checked)
-        self.refresh_history_tree()
+        # Applies to the orders in the current view; selections outside it are kept
+        ids = {o.get('order_id') for o in self.history_displayed_items}
+        if self.var_select_all_history.get():
+            self.history_selected |= ids
+        else:
+            self.history_selected -= ids
+        self.h_grid.refresh()
+
+    def selected_history_orders(self):
+        """Checked orders: those in view in display order, then any checked under an earlier filter."""
+        shown = [o for o in self.history_displayed_items if o.get('order_id') in self.history_selected]
+        shown_ids = {o.get('order_id') for o in shown}
+        hidden = []
+        for order_id in sorted(self.history_selected - shown_ids):
+            order = self.history_manager.get_order(order_id)
+            if order is None:
+                self.history_selected.discard(order_id) # deleted meanwhile
+            else:
+                hidden.append(order)
+        return shown + hidden
+
+    def _hidden_selection_note(self, selected):
+        """A line saying how many of selected are not in the current view, or ''."""
+        hidden = len(selected) - sum(1 for o in self.history_displayed_items if o.get('order_id') in self.history_selected)
+        return f"\n(其中 {hidden} 条不在当前列表 / {hidden} not in the current view)" if hidden > 0 else ""
+
+    def _confirm_export_hidden(self, to_export):
+        """Ask before exporting checked orders that the current filter hides."""
+        note = self._hidden_selection_note(to_export)
+        if not note:
+            return True
+        count = len(to_export)
+        return messagebox.askyesno("Confirm Export", f"确定要导出选中的 {count} 张单据吗？{note}\n\nExport {count} orders?")
 
     def delete_selected_history(self):
-        to_delete = [item for item in self.history_displayed_items if item.get('_checked')]
+        to_delete = self.selected_history_orders()
         if not to_delete:
             messagebox.showinfo("Info", "请先勾选需要删除的记录 / Please select orders to delete")
             return
             
         count = len(to_delete)
-        if not messagebox.askyesno("Confirm Delete", f"确定要删除选中的 {count} 条记录吗？\n此操作不可恢复！\n\nDelete {count} orders?"):
+        note = self._hidden_selection_note(to_delete)
+        if not messagebox.askyesno("Confirm Delete", f"确定要删除选中的 {count} 条记录吗？\n此操作不可恢复！{note}\n\nDelete {count} orders?"):
             return
             
         # Get IDs
@@ -974,6 +1238,7 @@ class DeliveryApp:
         
         # Delete from backend
         deleted_count = self.history_manager.delete_orders(ids)
+        self.history_selected.difference_update(ids)
         
         if deleted_count > 0:
             messagebox.showinfo("Success", f"成功删除 {deleted_count} 条记录 / Deleted successfully")
@@ -1029,51 +1294,166 @@ class DeliveryApp:
         filepath = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
             initialfile=f"销售汇总_{datetime.date.today()}.xlsx",
-            filetypes=[("Excel Files", "*.xlsx")]
+            filetypes=[("Excel Files", "*.xlsx"), ("CSV Files", "*.csv"), ("TSV Files", "*.tsv")]
         )
-        if filepath:
-            self.history_manager.export_summary_to_excel(orders, filepath)
-            messagebox.showinfo("Success", "Summary Exported")
+        if not filepath:
+            return
+
+        # The extension picks the format; CSV/TSV are much faster for big histories
+        ext = os.path.splitext(filepath)[1].lower()
+        try:
+            if ext == '.csv':
+                self.history_manager.export_summary_to_csv(orders, filepath)
+            elif ext == '.tsv':
+                self.history_manager.export_summary_to_csv(orders, filepath, delimiter='\t')
+            else:
+                self.history_manager.export_summary_to_excel(
+                    orders, filepath, split_by_month=bool(self.var_summary_by_month.get())
+                )
+        except Exception as e:
+            debug_utils.log(f"Export summary failed: {e}")
+            messagebox.showerror("Error", f"导出失败 / Export failed: {e}")
+            return
+        messagebox.showinfo("Success", "Summary Exported")
 
     def export_selected_pdfs(self):
-        to_export = [item for item in self.history_displayed_items if item.get('_checked')]
+        to_export = self.selected_history_orders()
         if not to_export:
             messagebox.showinfo("Info", "请先勾选需要导出的单据 / Please select orders to export")
             return
-            
-        count = len(to_export)
-        
+        if not self._confirm_export_hidden(to_export):
+            return
+
         # Ask for directory
         directory = filedialog.askdirectory(title="选择导出文件夹 / Select Export Folder")
         if not directory:
             return
             
-        success_count = 0
+        seller_name = self.entry_seller_name.get() # Ensure consistent using main tab entry
+        self._save_seller_info(seller_name)
+
+        # Render in worker processes; the window stays responsive meanwhile
+        from batch_export import BatchExporter
+        exporter = BatchExporter(
+            to_export, directory,
+            seller_info={'name': seller_name},
+            font_hint=self.order_generator.config.get("pdf_font"),
+        )
+        self._run_batch_export(exporter, directory)
+
+    def export_selected_zip(self):
+        """Export checked orders as one zip of PDFs, written straight from memory."""
+        to_export = self.selected_history_orders()
+        if not to_export:
+            messagebox.showinfo("Info", "请先勾选需要导出的单据 / Please select orders to export")
+            return
+        if not self._confirm_export_hidden(to_export):
+            return
+
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=".zip",
+            initialfile=f"出货单_{datetime.date.today()}.zip",
+            filetypes=[("ZIP Files", "*.zip")]
+        )
+        if not filepath:
+            return
+
+        seller_name = self.entry_seller_name.get()
+        self._save_seller_info(seller_name)
+
+        from batch_export import BatchExporter
+        exporter = BatchExporter(
+            to_export,
+            seller_info={'name': seller_name},
+            font_hint=self.order_generator.config.get("pdf_font"),
+            zip_path=filepath,
+        )
+        self._run_batch_export(exporter, filepath)
+
+    def _run_batch_export(self, exporter, destination):
+        """Start exporter and show its progress until it finishes."""
+        count = exporter.total
         try:
-            for item in to_export:
-                # Remove UI state if passed directly, but export_pdf only uses dict keys anyway.
-                # Construct filename: OrderID_Customer.pdf
-                safe_name = item.get('order_id', 'Unknown').replace('/', '_') # sanitize slashes
-                safe_cust = item.get('customer', 'Client').replace('/', '_')
-                filename = f"{safe_name}_{safe_cust}.pdf"
-                filepath = os.path.join(directory, filename)
-                
-                filename = f"{safe_name}_{safe_cust}.pdf"
-                filepath = os.path.join(directory, filename)
-                
-                filename = f"{safe_name}_{safe_cust}.pdf"
-                filepath = os.path.join(directory, filename)
-                
-                seller_name = self.entry_seller_name.get() # Ensure consistent using main tab entry
-                self._save_seller_info(seller_name)
-                
-                export_pdf(item, filepath, report_type='delivery', seller_info={'name': seller_name})
-                success_count += 1
-                
-            messagebox.showinfo("Success", f"成功导出 {success_count} 个文件!\nSaved to {directory}")
-            
+            exporter.start()
         except Exception as e:
             messagebox.showerror("Error", f"导出失败 / Export failed: {e}")
+            return
+
+        dialog = ProgressDialog(self.root, "导出单据 / Exporting", count, on_cancel=exporter.cancel)
+
+        def poll():
+            done, total = exporter.progress()
+            dialog.update_progress(done, total)
+            if not exporter.is_finished():
+                self.root.after(100, poll)
+                return
+
+            dialog.destroy()
+            report = exporter.report()
+            msg = f"成功导出 {len(report['succeeded'])} 个文件!\nSaved to {destination}"
+            if report['cancelled']:
+                msg += f"\n已取消 {report['cancelled']} 个 / Cancelled"
+            if report['failed']:
+                failed_lines = "\n".join(
+                    f"{os.path.basename(path)}: {err}" for path, err in report['failed'][:10]
+                )
+                msg += f"\n\n失败 {len(report['failed'])} 个 / Failed:\n{failed_lines}"
+                messagebox.showwarning("Export", msg)
+            else:
+                messagebox.showinfo("Success", msg)
+
+        poll()
+
+    def export_selected_combined(self):
+        """Export all checked orders into a single PDF, e.g. for month-end printing."""
+        to_export = self.selected_history_orders()
+        if not to_export:
+            messagebox.showinfo("Info", "请先勾选需要导出的单据 / Please select orders to export")
+            return
+        if not self._confirm_export_hidden(to_export):
+            return
+
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            initialfile=f"出货单合并_{datetime.date.today()}.pdf",
+            filetypes=[("PDF Files", "*.pdf")]
+        )
+        if not filepath:
+            return
+
+        seller_name = self.entry_seller_name.get()
+        self._save_seller_info(seller_name)
+
+        # Render on a worker thread; poll it from the Tk loop
+        from export_pdf import export_combined_pdf
+        state = {'done': 0, 'error': None, 'finished': False}
+
+        def progress(done, total):
+            state['done'] = done
+
+        def work():
+            try:
+                export_combined_pdf(to_export, filepath, seller_info={'name': seller_name}, progress=progress)
+            except Exception as e:
+                state['error'] = e
+            finally:
+                state['finished'] = True
+
+        threading.Thread(target=work, daemon=True).start()
+        dialog = ProgressDialog(self.root, "导出单据 / Exporting", len(to_export))
+
+        def poll():
+            dialog.update_progress(state['done'], len(to_export))
+            if not state['finished']:
+                self.root.after(100, poll)
+                return
+            dialog.destroy()
+            if state['error']:
+                messagebox.showerror("Error", f"导出失败 / Export failed: {state['error']}")
+            else:
+                messagebox.showinfo("Success", f"成功导出 {len(to_export)} 张单据到一个文件!\nSaved to {filepath}")
+
+        poll()
 
     def setup_summary_tab(self):
         # Frame for controls
@@ -1084,7 +1464,10 @@ class DeliveryApp:
         row1 = ttk.Frame(frame)
         row1.pack(fill='x', pady=10)
         ttk.Label(row1, text="选择客户 (Customer):", width=20, anchor='e').pack(side='left', padx=5)
-        self.all_customers_summary = self.history_manager.get_unique_customers()
+        # Filled in by _on_history_loaded if the history is still loading
+        self.all_customers_summary = (
+            self._history_manager.get_unique_customers() if self._history_manager is not None else []
+        )
         self.cb_summary_customer = ttk.Combobox(row1, values=self.all_customers_summary, width=25)
         self.cb_summary_customer.pack(side='left', padx=5)
         
@@ -1227,14 +1610,22 @@ class DeliveryApp:
                 self._save_seller_info(seller_name)
                 
                 if fmt == 'excel':
+                    from export_excel import export_to_excel
                     export_to_excel(summary_data, filepath, report_type='summary', seller_info={'name': seller_name})
                 else:
+                    from export_pdf import export_pdf
                     export_pdf(summary_data, filepath, report_type='summary', seller_info={'name': seller_name})
                     
                 messagebox.showinfo("Success", f"对账单已生成!\nMode: {mode}\nSaved to {filepath}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed: {e}")
 
+    def _remember_font_choice(self, choice):
+        """Store the winning font file so later launches skip probing. Runs on the prewarm thread."""
+        if choice and list(choice) != self.order_generator.config.get("pdf_font"):
+            self.order_generator.config["pdf_font"] = list(choice)
+            self.order_generator.save_config()
+
     def _save_seller_info(self, seller_name):
         """Helper to save current seller name and update history list in config."""
         if not seller_name: return
@@ -1256,6 +1647,253 @@ class DeliveryApp:
             
         self.order_generator.save_config()
 
+class VirtualTree(ttk.Frame):
+    """A Treeview that only holds the rows currently on screen.
+
+    The data lives with the owner: row_values(index) returns the values for
+    row index, and set_count(n) says how many rows there are. A small pool of
+    Treeview items is reused as the user scrolls, so showing 50 or 50,000
+    rows costs the same. The scrollbar, mouse wheel and paging keys move a
+    virtual offset, and a label shows which rows are in view.
+    """
+
+    def __init__(self, parent, columns, row_values):
+        super().__init__(parent)
+        self.row_values = row_values
+        self.count = 0
+        self.offset = 0        # index of the first visible row
+        self.page_size = 1     # rows that fit in the widget, updated on resize
+        self._row_height = None
+        self._pool = []        # Treeview iids, top to bottom
+        self._pool_pos = {}    # iid -> position in _pool
+
+        body = ttk.Frame(self)
+        body.pack(fill='both', expand=True)
+        self.tree = ttk.Treeview(body, columns=columns, show='headings')
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self._on_scrollbar)
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.lbl_position = ttk.Label(self, anchor='e')
+        self.lbl_position.pack(fill='x')
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.offset - 3))  # X11 wheel up
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.offset + 3))  # X11 wheel down
+        self.tree.bind("<Prior>", lambda e: self.scroll_to(self.offset - self.page_size))
+        self.tree.bind("<Next>", lambda e: self.scroll_to(self.offset + self.page_size))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(self.count))
+
+    def set_count(self, count):
+        """The data changed size (or content); redraw from the current position."""
+        self.count = count
+        self._clear_selection() # the rows may now show other data
+        self.scroll_to(self.offset)
+
+    def refresh(self):
+        """Re-read the values of the visible rows."""
+        self._fill()
+
+    def set_placeholder(self, text):
+        """Show no rows, just text in the position label (e.g. while loading)."""
+        self.count = 0
+        self.offset = 0
+        self._clear_selection()
+        self._fill()
+        self.lbl_position.config(text=text)
+
+    def index_of(self, iid):
+        """Data index of a Treeview item, or None."""
+        pos = self._pool_pos.get(iid)
+        return None if pos is None else self.offset + pos
+
+    def visible_indices(self):
+        """Data indices of the rows on screen."""
+        return range(self.offset, self.offset + len(self._pool))
+
+    def refresh_index(self, index):
+        """Re-read one row, if it is on screen."""
+        pos = index - self.offset
+        if 0 <= pos < len(self._pool):
+            self.tree.item(self._pool[pos], values=self.row_values(index))
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, self.count - self.page_size))
+        if offset != self.offset:
+            # Pool rows are reused, so a highlight would stay put while the data moves under it
+            self._clear_selection()
+        self.offset = offset
+        self._fill()
+
+    def _clear_selection(self):
+        selected = self.tree.selection()
+        if selected:
+            self.tree.selection_remove(selected)
+
+    def _fill(self):
+        n = max(0, min(self.page_size, self.count - self.offset))
+        while len(self._pool) > n:
+            self.tree.delete(self._pool.pop())
+        while len(self._pool) < n:
+            self._pool.append(self.tree.insert("", "end"))
+        self._pool_pos = {iid: pos for pos, iid in enumerate(self._pool)}
+
+        for pos, iid in enumerate(self._pool):
+            self.tree.item(iid, values=self.row_values(self.offset + pos))
+
+        if self.count:
+            self.scrollbar.set(self.offset / self.count, (self.offset + n) / self.count)
+            self.lbl_position.config(
+                text=f"第 {self.offset + 1}-{self.offset + n} 条 / 共 {self.count} 条"
+            )
+        else:
+            self.scrollbar.set(0, 1)
+            self.lbl_position.config(text="共 0 条")
+
+    def _on_resize(self, event=None):
+        if self._row_height is None:
+            # Measure an actual row: bbox gives the heading height and row height
+            if not self._pool:
+                self._pool.append(self.tree.insert("", "end"))
+            bbox = self.tree.bbox(self._pool[0])
+            if not bbox:
+                # Drawn at idle time; a hidden tab will get another <Configure> when shown
+                if self.tree.winfo_ismapped():
+                    self.after(50, self._on_resize)
+                return
+            self._header_height, self._row_height = bbox[1], bbox[3]
+            self.page_size = 0   # force the redraw below
+
+        rows = max(1, (self.tree.winfo_height() - self._header_height) // self._row_height)
+        if rows != self.page_size:
+            self.page_size = rows
+            self.scroll_to(self.offset)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * self.count))
+        elif action == 'scroll':
+            step = self.page_size if unit == 'pages' else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_to(self.offset - delta * 3)
+        return "break"
+
+
+class ProgressDialog(tk.Toplevel):
+    """Modal progress bar for background jobs. The owner polls and calls update_progress()."""
+
+    def __init__(self, parent, title, total, on_cancel=None):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("360x130")
+        self.resizable(False, False)
+        self.transient(parent)
+        self.on_cancel = on_cancel
+
+        # total=None: size not known up front, the bar just shows activity
+        self.lbl = ttk.Label(self, text=f"0 / {total}" if total is not None else "")
+        self.lbl.pack(pady=(15, 5))
+
+        self.bar = ttk.Progressbar(self, length=300, mode='determinate', maximum=max(total or 0, 1))
+        self.bar.pack(pady=5)
+
+        self.btn_cancel = ttk.Button(self, text="取消 / Cancel", command=self.cancel)
+        if on_cancel:
+            self.btn_cancel.pack(pady=5)
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.grab_set()
+
+    def update_progress(self, done, total, text=None):
+        if total is None:
+            self.bar.configure(mode='indeterminate')
+            self.bar.step(5)
+        else:
+            self.bar.configure(mode='determinate', maximum=max(total, 1), value=done)
+        self.lbl.config(text=text or f"{done} / {total if total is not None else '?'}")
+
+    def cancel(self):
+        if not self.on_cancel:
+            return # Not cancellable; the owner closes the dialog when done
+        self.on_cancel()
+        self.btn_cancel.config(state='disabled', text="正在取消... / Cancelling")
+
+
+class ImportDiffDialog(tk.Toplevel):
+    """Shows what a product import would change; sets confirmed when the user applies it."""
+
+    # Rows shown per kind; the counts in the summary line are always complete
+    MAX_ROWS = 2000
+
+    def __init__(self, parent, diff):
+        super().__init__(parent)
+        self.title("导入预览 / Import Preview")
+        self.geometry("760x480")
+        self.transient(parent)
+        self.confirmed = False
+
+        summary = (
+            f"新增 {len(diff['added'])}   调价 {len(diff['price_changed'])}   "
+            f"修改 {len(diff['field_changed'])}   未变 {diff['unchanged']}"
+        )
+        ttk.Label(self, text=summary, font=('Arial', 11, 'bold')).pack(pady=(10, 5))
+
+        list_frame = ttk.Frame(self)
+        list_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        cols = ("类型", "商品名称", "原内容", "新内容")
+        self.tree = ttk.Treeview(list_frame, columns=cols, show='headings')
+        for col, width in zip(cols, (70, 200, 220, 220)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width)
+
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        for p in diff['added'][:self.MAX_ROWS]:
+            self.tree.insert("", "end", values=("新增", p['name'], "", self._describe(p)))
+        for old, new in diff['price_changed'][:self.MAX_ROWS]:
+            self.tree.insert("", "end", values=(
+                "调价", new['name'], self._format_price(old.get('price')), self._format_price(new.get('price'))
+            ))
+        for old, new in diff['field_changed'][:self.MAX_ROWS]:
+            self.tree.insert("", "end", values=("修改", new['name'], self._describe(old), self._describe(new)))
+
+        btn_frame = ttk.Frame(self, padding=10)
+        btn_frame.pack(fill='x')
+        ttk.Button(btn_frame, text="确认导入 / Apply", command=self.apply).pack(side='right')
+        ttk.Button(btn_frame, text="取消 / Cancel", command=self.destroy).pack(side='right', padx=10)
+
+        self.grab_set()
+
+    @staticmethod
+    def _format_price(value):
+        # Older catalogs may hold prices as free text; show those as they are
+        try:
+            return f"{float(value or 0):.2f}"
+        except (TypeError, ValueError):
+            return str(value)
+
+    @classmethod
+    def _describe(cls, p):
+        return " / ".join(str(v) for v in (
+            p.get('model', ''), p.get('machine_model', ''), p.get('unit', ''),
+            cls._format_price(p.get('price')),
+        ) if v != '')
+
+    def apply(self):
+        self.confirmed = True
+        self.destroy()
+
+
 class BatchSelectionDialog(tk.Toplevel):
     def __init__(self, parent, product_manager):
         super().__init__(parent)
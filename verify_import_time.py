@@ -0,0 +1,67 @@
+"""Startup import check: fails if importing the UI gets slow or pulls in heavy libraries.
+
+Runs `python -X importtime -c "import ui"` in a fresh interpreter and checks
+  * the cumulative import time of `ui` against a budget (ms), and
+  * that none of the export-only libraries are imported at startup.
+
+Usage: python verify_import_time.py [budget_ms]
+"""
+import os
+import subprocess
+import sys
+
+# Importing ui takes ~60 ms on a typical dev machine; leave room for slower ones
+DEFAULT_BUDGET_MS = 150
+
+# Only needed on export/import/About; must stay out of the startup path
+LAZY_MODULES = ['reportlab', 'openpyxl', 'PIL', 'multiprocessing']
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+
+
+def measure():
+    """{module: cumulative import time in us} for `import ui`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ui'],
+        cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import ui failed:\n{result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    times = measure()
+
+    total_ms = times['ui'] / 1000
+    print(f"import ui: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+
+    slowest = sorted(times.items(), key=lambda kv: kv[1], reverse=True)[1:11]
+    for name, us in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    loaded = sorted({name.split('.')[0] for name in times} & set(LAZY_MODULES))
+    ok = True
+    if loaded:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(loaded)}")
+        ok = False
+    if total_ms > budget_ms:
+        print(f"FAIL: startup imports over budget by {total_ms - budget_ms:.1f} ms")
+        ok = False
+
+    if ok:
+        print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())